@@ -1,14 +1,111 @@
-from flask import Flask, render_template
+from flask import Flask, render_template, jsonify, abort, copy_current_request_context, request
+from concurrent.futures import ThreadPoolExecutor, wait
+import gzip
 import logging
+import os
+
+from reponses_http import encodage_accepte
 
 logging.basicConfig(level=logging.INFO)
 
-def create_app():
+# Page d'accueil : par défaut la page est renvoyée tout de suite et chaque bloc est chargé par le client
+# (/fragment/<nom>) ; ACCUEIL_RENDU_SERVEUR=1 rend les blocs côté serveur, en parallèle, et ne diffère
+# au client que ceux qui dépassent ACCUEIL_TIMEOUT_S.
+ACCUEIL_RENDU_SERVEUR = os.environ.get("ACCUEIL_RENDU_SERVEUR", "0") == "1"
+ACCUEIL_TIMEOUT_S = float(os.environ.get("ACCUEIL_TIMEOUT_S", "1.0"))
+
+# Profil de production (cf. wsgi.py) : templates figés, compression, ETag, revalidation des fichiers statiques.
+# Sans ce drapeau, comportement de développement (rechargement des templates, aucun cache).
+INSEE_PRODUCTION = os.environ.get("INSEE_PRODUCTION", "0") == "1"
+TYPES_COMPRESSIBLES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+TAILLE_MIN_COMPRESSION = 1024
+
+
+def _bloc_histo():
+    try:
+        import histogrammes as hist_mod
+        regions = hist_mod.get_regions()
+        bokeh_js = hist_mod.ressources_bokeh().render_js()
+        bokeh_css = hist_mod.ressources_bokeh().render_css()
+        return render_template('_histo_fragment.html', regions=regions, bokeh_js=bokeh_js, bokeh_css=bokeh_css, embed=True,
+                               mode_donnees=hist_mod.MODE_DONNEES)
+    except Exception as e:
+        logging.warning('Could not render histogram block: %s', e)
+        return '<div class="alert alert-warning">Histogram unavailable</div>'
+
+
+def _bloc_cartes():
+    try:
+        import carte_nationalites_par_epci as carte_mod
+        Nationalite = sorted(carte_mod.get_index_nationalites())
+        return render_template('_map_fragment.html', Nationalite=Nationalite, embed=True)
+    except Exception as e:
+        logging.warning('Could not render map block: %s', e)
+        return '<div class="alert alert-warning">Carte unavailable</div>'
+
+
+def _bloc_mon():
+    try:
+        import mon_graphique as mon_mod
+        # obtenir le HTML de la carte folium et l'insérer dans le fragment
+        map_html, regions, selected = mon_mod.get_map_html()
+        return render_template('_mon_graph_fragment.html', map_html=map_html, regions=regions, selected_region=selected)
+    except Exception as e:
+        logging.warning('Could not render mon graph block: %s', e)
+        return '<div class="alert alert-warning">Carte exemple indisponible</div>'
+
+
+BLOCS = {
+    'histo': _bloc_histo,
+    'cartes': _bloc_cartes,
+    'mon': _bloc_mon,
+}
+
+
+def _bloc_differe(nom):
+    """Emplacement rempli par le client depuis /fragment/<nom>."""
+    return (f'<div data-fragment="/fragment/{nom}">'
+            f'<div class="text-muted py-5 text-center">Chargement…</div></div>')
+
+def _compresser_et_etiqueter(response):
+    """Production : gzip des réponses texte, puis ETag et 304 sur les GET.
+
+    Les réponses déjà compressées par les blueprints (Content-Encoding présent) ne
+    sont pas recompressées ; l'ETag est calculé sur le corps envoyé, il diffère donc
+    entre version compressée et non compressée.
+    """
+    if request.method != 'GET' or response.status_code != 200 or response.direct_passthrough \
+            or request.endpoint == 'static':
+        return response
+    if 'Content-Encoding' not in response.headers and response.mimetype.startswith(TYPES_COMPRESSIBLES):
+        response.vary.add('Accept-Encoding')
+        corps = response.get_data()
+        if len(corps) >= TAILLE_MIN_COMPRESSION and encodage_accepte() == 'gzip':
+            response.set_data(gzip.compress(corps, compresslevel=6))
+            response.headers['Content-Encoding'] = 'gzip'
+    if 'ETag' not in response.headers:
+        response.add_etag()
+        # le navigateur garde la réponse mais revalide à chaque fois (304 si inchangée)
+        response.headers.setdefault('Cache-Control', 'no-cache')
+    return response.make_conditional(request)
+
+
+def create_app(production=None):
     app = Flask(__name__, template_folder='templates', static_folder='static')
-    # Désactiver la mise en cache des templates
-    app.config['TEMPLATES_AUTO_RELOAD'] = True
-    app.jinja_env.auto_reload = True
-    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
+    if production is None:
+        production = INSEE_PRODUCTION
+    app.config['INSEE_PRODUCTION'] = production
+    if production:
+        app.config['TEMPLATES_AUTO_RELOAD'] = False
+        # fichiers statiques : URL sans empreinte, donc pas de cache long ; no-cache + ETag / Last-Modified,
+        # le navigateur revalide (304) et voit les nouveaux JS / CSS dès le déploiement
+        app.config['SEND_FILE_MAX_AGE_DEFAULT'] = None
+        app.after_request(_compresser_et_etiqueter)
+    else:
+        # Désactiver la mise en cache des templates
+        app.config['TEMPLATES_AUTO_RELOAD'] = True
+        app.jinja_env.auto_reload = True
+        app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
 
     # Enregistrer les blueprints
     try:
@@ -37,38 +134,55 @@ def create_app():
     except Exception as e:
         logging.warning('Could not register mon_graphique blueprint: %s', e)
 
+    # Tuiles de géométrie EPCI + valeurs par sélection (alternative légère aux cartes folium complètes)
+    try:
+        from tuiles_epci import bp as tuiles_bp
+        app.register_blueprint(tuiles_bp, url_prefix='/epci')
+    except Exception as e:
+        logging.warning('Could not register tuiles blueprint: %s', e)
+
+    # Chargement parallèle des jeux de données enregistrés par les blueprints, puis surveillance des changements
+    # (en production : chargement avant fork par wsgi.py, surveillance lancée dans chaque worker)
+    from gestion_donnees import gestionnaire
+    if not production:
+        gestionnaire.demarrer()
+
+    # Server-Timing, /metrics et profileur optionnel (cf. instrumentation.py)
+    from instrumentation import ajouter_jauges, installer
+    installer(app, prefixe='insee')
+
+    @ajouter_jauges
+    def _jauges_donnees():
+        for nom, etat in gestionnaire.stats().items():
+            yield 'jeu_version', {'jeu': nom}, etat['version']
+            yield 'jeu_duree_chargement_secondes', {'jeu': nom}, etat['duree_chargement_s']
+
+    @app.route('/etat_donnees')
+    def etat_donnees():
+        # versions et durées de chargement des jeux de données
+        return jsonify(gestionnaire.stats())
+
+    _pool_accueil = ThreadPoolExecutor(max_workers=len(BLOCS), thread_name_prefix='accueil')
+
+    @app.route('/fragment/<nom>')
+    def fragment(nom):
+        if nom not in BLOCS:
+            abort(404)
+        return BLOCS[nom]()
+
     @app.route('/')
     def index():
-        # Rendre les fragments histogramme et cartes dans la page d'accueil
-        try:
-            import histogrammes as hist_mod
-            df = hist_mod.get_agg_df()
-            regions = sorted(df["region"].unique()) if not df.empty else []
-            bokeh_js = hist_mod.RES.render_js()
-            bokeh_css = hist_mod.RES.render_css()
-            histo_block = render_template('_histo_fragment.html', regions=regions, bokeh_js=bokeh_js, bokeh_css=bokeh_css, embed=True)
-        except Exception as e:
-            logging.warning('Could not render histogram block: %s', e)
-            histo_block = '<div class="alert alert-warning">Histogram unavailable</div>'
-
-        try:
-            import carte_nationalites_par_epci as carte_mod
-            gdf = carte_mod.get_geo_df()
-            Nationalite = sorted(gdf["Nationalite"].unique()) if not gdf.empty else []
-            map_block = render_template('_map_fragment.html', Nationalite=Nationalite, embed=True)
-        except Exception as e:
-            logging.warning('Could not render map block: %s', e)
-            map_block = '<div class="alert alert-warning">Carte unavailable</div>'
-
-        try:
-            import mon_graphique as mon_mod
-            # obtenir le HTML de la carte folium et l'insérer dans le fragment
-            map_html, regions, selected = mon_mod.get_map_html()
-            mon_block = render_template('_mon_graph_fragment.html', map_html=map_html, regions=regions, selected_region=selected)
-        except Exception as e:
-            logging.warning('Could not render mon graph block: %s', e)
-            mon_block = '<div class="alert alert-warning">Carte exemple indisponible</div>'
-        return render_template('index.html', histo_block=histo_block, map_block=map_block, mon_block=mon_block)
+        blocs = {nom: _bloc_differe(nom) for nom in BLOCS}
+        if ACCUEIL_RENDU_SERVEUR:
+            # rendu concurrent ; un bloc trop lent reste différé au client au lieu de retarder la page
+            futures = {nom: _pool_accueil.submit(copy_current_request_context(rendre)) for nom, rendre in BLOCS.items()}
+            wait(futures.values(), timeout=ACCUEIL_TIMEOUT_S)
+            for nom, future in futures.items():
+                if future.done():
+                    blocs[nom] = future.result()
+                else:
+                    logging.info('Bloc %s différé au client (> %.1f s)', nom, ACCUEIL_TIMEOUT_S)
+        return render_template('index.html', histo_block=blocs['histo'], map_block=blocs['cartes'], mon_block=blocs['mon'])
 
     return app
 
@@ -1,23 +1,45 @@
 from flask import Blueprint, render_template, request
-import folium
-import geopandas as gpd
-import branca
+import os
+
+from gestion_donnees import JeuDeDonnees, gestionnaire, signal_fichier
 
 # Expose un Blueprint afin que ce module puisse être enregistré dans l'application principale
 bp = Blueprint('carte_region', __name__, template_folder='templates', static_folder='static')
 
-# Charger les données
-data = gpd.read_file(r"C:\Users\info\Desktop\Dev\data_etrangers.geojson")
+# Données : même fichier que mon_graphique.py (INSEE_DATA_ETRANGERS), géométries complètes.
+# Lecture, liste des régions et colormap à la première requête seulement : cette page est remplacée par
+# mon_graphique.py, ses géométries complètes ne sont pas préchargées dans chaque worker.
+DATA_PATH = os.environ.get('INSEE_DATA_ETRANGERS', os.path.join(os.path.dirname(__file__), 'data_etrangers.geojson'))
+
+
+def _charger():
+    import branca
+    import geopandas as gpd
+
+    # Charger les données
+    data = gpd.read_file(DATA_PATH)
 
-# Liste des régions
-regions = data['region_name'].unique().tolist()
+    # Définir une colormap pour le Choropleth
+    colormap = branca.colormap.linear.YlOrRd_09.scale(data['Pct_Etranger'].min(), data['Pct_Etranger'].max())
+    colormap.caption = '% Étrangers'
+
+    # Liste des régions
+    return {'data': data, 'regions': data['region_name'].unique().tolist(), 'colormap': colormap}
+
+
+jeu_carte_region = gestionnaire.enregistrer(JeuDeDonnees(
+    "carte_region", _charger, signal=signal_fichier(DATA_PATH), prechauffage=False,
+))
 
-# Définir une colormap pour le Choropleth
-colormap = branca.colormap.linear.YlOrRd_09.scale(data['Pct_Etranger'].min(), data['Pct_Etranger'].max())
-colormap.caption = '% Étrangers'
 
 @bp.route('/mappy', methods=['GET', 'POST'])
 def index():
+    import folium
+
+    jeu = jeu_carte_region.get()
+    if jeu is None:
+        raise RuntimeError(f"Données indisponibles : {DATA_PATH}")
+    data, regions, colormap = jeu['data'], jeu['regions'], jeu['colormap']
     region_selected = request.form.get('region', regions[0])
 
         #  Filtrer la région sélectionnée
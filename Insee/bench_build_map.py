@@ -0,0 +1,98 @@
+# bench_build_map.py
+"""Micro-benchmark de mon_graphique.build_map sur toutes les régions, avant / après l'index des régions.
+
+    python bench_build_map.py                 # data_etrangers.geojson
+    python bench_build_map.py --synthetique 13 --epci 1250
+
+« avant » reproduit l'ancien build_map (filtre, colormap et GeoJSON recalculés à
+chaque appel) ; « après, 1er appel » inclut le rendu folium de la région,
+« après, appels suivants » correspond au cache HTML.
+"""
+import argparse
+import statistics
+import time
+
+import branca
+import folium
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import box
+
+import mon_graphique
+
+
+def donnees_synthetiques(n_regions=13, n_epci=1250, seed=0):
+    """Grille d'EPCI carrés répartis en régions, avec les colonnes utilisées par build_map."""
+    rng = np.random.default_rng(seed)
+    cote = int(np.ceil(np.sqrt(n_epci)))
+    lignes = []
+    for i in range(n_epci):
+        x, y = i % cote, i // cote
+        pct = float(rng.uniform(0, 25))
+        lignes.append({
+            "nom": f"EPCI {i}",
+            "region_name": f"Région {i * n_regions // n_epci}",
+            "Pct_Etranger": pct,
+            "Pct_Etranger_str": f"{pct:.1f} %",
+            "top3_nationalites": "Portugal, Maroc, Algérie",
+            # des polygones à nombreux sommets, comme des contours réels
+            "geometry": box(-4 + x * 0.25, 42 + y * 0.2, -4 + (x + 1) * 0.25, 42 + (y + 1) * 0.2).segmentize(0.005),
+        })
+    return gpd.GeoDataFrame(lignes, crs=4326)
+
+
+def build_map_origine(data, region_selected):
+    """L'ancien build_map, conservé ici comme référence."""
+    regions = data['region_name'].unique().tolist()
+    gdf_region = data[data['region_name'] == region_selected]
+    minx, miny, maxx, maxy = gdf_region.total_bounds
+    m = folium.Map(location=[(miny + maxy) / 2, (minx + maxx) / 2], zoom_start=6)
+    m.fit_bounds([[miny, minx], [maxy, maxx]])
+    colormap = branca.colormap.linear.YlOrRd_09.scale(data['Pct_Etranger'].min(), data['Pct_Etranger'].max())
+    colormap.caption = '% Étrangers'
+    colormap.add_to(m)
+
+    def style_function(feature):
+        pct = feature['properties'].get('Pct_Etranger')
+        return {'fillColor': colormap(pct) if pct is not None else 'gray', 'color': 'black', 'weight': 1, 'fillOpacity': 0.7}
+
+    folium.GeoJson(
+        gdf_region,
+        style_function=style_function,
+        tooltip=folium.GeoJsonTooltip(fields=['nom', 'Pct_Etranger_str', 'top3_nationalites'],
+                                      aliases=['EPCI:', 'Pct étrangers:', 'Top 3 nationalités:'], localize=True),
+    ).add_to(m)
+    return m._repr_html_(), regions, region_selected
+
+
+def chrono(fonction, *args):
+    debut = time.perf_counter()
+    fonction(*args)
+    return time.perf_counter() - debut
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--synthetique", type=int, metavar="N_REGIONS", help="données synthétiques avec N régions")
+    parser.add_argument("--epci", type=int, default=1250)
+    args = parser.parse_args()
+
+    if args.synthetique:
+        mon_graphique.jeu_etrangers.publier(donnees_synthetiques(args.synthetique, args.epci))
+    data = mon_graphique.get_data()
+    mon_graphique.vider_cache()
+    regions = data['region_name'].unique().tolist()
+
+    avant = [chrono(build_map_origine, data, r) for r in regions]
+    index = chrono(mon_graphique.get_index_regions)
+    premier = [chrono(mon_graphique.build_map, r) for r in regions]
+    suivants = [chrono(mon_graphique.build_map, r) for r in regions]
+
+    print(f"{len(regions)} régions, {len(data)} EPCI ; construction de l'index : {index * 1000:.0f} ms")
+    for libelle, mesures in (("avant", avant), ("après, 1er appel", premier), ("après, appels suivants", suivants)):
+        print(f"{libelle:>24} : médiane {statistics.median(mesures) * 1000:9.2f} ms, "
+              f"total {sum(mesures) * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
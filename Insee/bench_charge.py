@@ -0,0 +1,269 @@
+# bench_charge.py
+"""Test de charge des endpoints de l'application Insee et du serveur de carte des usines.
+
+    python bench_charge.py                               # 13 régions, 1250 EPCI, 8 clients
+    python bench_charge.py --concurrence 1 4 16 --requetes 400
+    python bench_charge.py --production --comparer       # profil wsgi.py, écart avec le dernier run
+
+Les données synthétiques (base SQLite de substitution, GeoJSON des régions,
+résultat de géocodage des usines) sont écrites dans un dossier temporaire ; les
+serveurs sont lancés dans des processus séparés pour mesurer leur propre mémoire.
+Les sélections suivent une loi de Zipf (quelques régions / nationalités très
+demandées, une longue traîne), avec une graine fixe pour rester reproductibles.
+
+Pour chaque endpoint et niveau de concurrence : latences p50 / p95 / p99, débit,
+octets transmis par réponse et RSS maximal du serveur. Les résultats sont ajoutés
+à ``--sortie`` (une ligne JSON par run, avec le commit courant) ; ``--comparer``
+affiche l'écart avec le run précédent de même configuration.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+ICI = os.path.dirname(os.path.abspath(__file__))
+RACINE = os.path.dirname(ICI)
+PORT_USINES = 5050  # port fixé dans le script flask de la racine
+
+
+# --- Données synthétiques ---
+
+def preparer_donnees(dossier, n_regions, n_epci, n_usines):
+    """Écrit la base SQLite, le GeoJSON régional et le géocodage des usines ; renvoie les sélections possibles."""
+    from donnees_synthetiques import NATIONALITES, creer_base_sqlite
+    from bench_build_map import donnees_synthetiques
+    sys.path.insert(0, RACINE)
+    from bench_formats import frame_synthetique
+
+    creer_base_sqlite(os.path.join(dossier, "essai.db"), n_regions, n_epci)
+    donnees_synthetiques(n_regions, n_epci).to_file(os.path.join(dossier, "data_etrangers.geojson"), driver="GeoJSON")
+    frame_synthetique(n_usines).to_feather(os.path.join(dossier, "Geocodage_corrige.feather"))
+    # mêmes noms que tables_synthetiques
+    epcis = [(f"Région {i * n_regions // n_epci}", f"CC synthétique {i}") for i in range(n_epci)]
+    return {
+        "regions": sorted({region for region, _ in epcis}),
+        "epcis": epcis,
+        "nationalites": list(NATIONALITES),
+    }
+
+
+def tirage_zipf(elements, rng, s=1.1):
+    """Fonction de tirage : popularité décroissante selon un ordre aléatoire (graine fixe)."""
+    ordre = list(elements)
+    rng.shuffle(ordre)
+    poids = [1 / (rang + 1) ** s for rang in range(len(ordre))]
+    return lambda: rng.choices(ordre, poids)[0]
+
+
+def scenarios(selections, seed=0):
+    """Endpoints mesurés : nom -> (serveur, fonction renvoyant (chemin, paramètres))."""
+    rng = random.Random(seed)
+    region = tirage_zipf(selections["regions"], rng)
+    epci = tirage_zipf(selections["epcis"], rng)
+    nat = tirage_zipf(selections["nationalites"], rng)
+    return {
+        "histo_get_epci": ("insee", lambda: ("/histogrammes/get_epci", {"region": region()})),
+        "histo_get_data_plot": ("insee", lambda: ("/histogrammes/get_data_plot", dict(zip(("region", "epci"), epci())))),
+        "cartes_get_data_plot": ("insee", lambda: ("/cartes/get_data_plot", {"Nationalite": nat()})),
+        "epci_valeurs": ("insee", lambda: ("/epci/valeurs", {"Nationalite": nat()})),
+        "region_map_fragment": ("insee", lambda: ("/app_carte_region/map_fragment", {"region": region()})),
+        "usines_map": ("usines", lambda: ("/map", {})),
+    }
+
+
+# --- Serveurs ---
+
+def servir(port, production):
+    """Mode ``--serveur`` : l'application Insee sur un serveur werkzeug multi-thread."""
+    from werkzeug.serving import run_simple
+    if production:
+        from wsgi import app
+    else:
+        from app import create_app
+        app = create_app()
+    run_simple("127.0.0.1", port, app, threaded=True)
+
+
+def lancer(commande, cwd, env, url, timeout=300):
+    processus = subprocess.Popen(commande, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    debut = time.time()
+    while time.time() - debut < timeout:
+        if processus.poll() is not None:
+            raise RuntimeError(f"Le serveur s'est arrêté au démarrage : {' '.join(commande)}")
+        try:
+            requests.get(url, timeout=5)
+            return processus
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    processus.kill()
+    raise RuntimeError(f"Serveur non disponible après {timeout} s : {url}")
+
+
+def attendre_donnees(base, timeout=300):
+    """Attend que le gestionnaire de données ait chargé (ou tenté de charger) tous les jeux."""
+    debut = time.time()
+    while time.time() - debut < timeout:
+        try:
+            etat = requests.get(base + "/etat_donnees", timeout=5).json()
+            if all(jeu["version"] or jeu["erreur"] for jeu in etat.values()):
+                return etat
+        except (requests.RequestException, ValueError):
+            pass
+        time.sleep(0.5)
+    return None
+
+
+def memoire(pid):
+    """(RSS courant, RSS maximal) du processus en Mo, lus dans /proc (Linux) ; None ailleurs."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            valeurs = dict(ligne.split(":", 1) for ligne in f if ligne.startswith(("VmRSS", "VmHWM")))
+        return tuple(int(valeurs[cle].split()[0]) / 1024 for cle in ("VmRSS", "VmHWM"))
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+# --- Mesure ---
+
+def centile(valeurs, q):
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(round(q / 100 * (len(valeurs) - 1))))]
+
+
+def mesurer(base, tirage, n_requetes, concurrence, echauffement=10):
+    session_locale = threading.local()
+    # tirages faits d'avance, dans l'ordre : mêmes requêtes d'un run à l'autre
+    requetes = [tirage() for _ in range(n_requetes + echauffement)]
+
+    def envoyer(requete):
+        session = getattr(session_locale, "session", None)
+        if session is None:
+            session = session_locale.session = requests.Session()
+        chemin, params = requete
+        debut = time.perf_counter()
+        try:
+            r = session.get(base + chemin, params=params, headers={"Accept-Encoding": "gzip"}, timeout=120)
+            duree = time.perf_counter() - debut
+            octets = int(r.headers.get("Content-Length", len(r.content)))
+            return duree, octets, r.status_code >= 400
+        except requests.RequestException:
+            return time.perf_counter() - debut, 0, True
+
+    for requete in requetes[:echauffement]:
+        envoyer(requete)
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrence) as pool:
+        resultats = list(pool.map(envoyer, requetes[echauffement:]))
+    duree_totale = time.perf_counter() - debut
+
+    latences = [duree * 1000 for duree, _, _ in resultats]
+    return {
+        "requetes": n_requetes,
+        "erreurs": sum(erreur for _, _, erreur in resultats),
+        "p50_ms": centile(latences, 50),
+        "p95_ms": centile(latences, 95),
+        "p99_ms": centile(latences, 99),
+        "moyenne_ms": statistics.fmean(latences),
+        "debit_rps": n_requetes / duree_totale,
+        "octets_moyens": statistics.fmean(octets for _, octets, _ in resultats),
+    }
+
+
+def commit_courant():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ICI, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparer(precedent, courant):
+    print(f"\nÉcart avec le run {precedent['commit']} du {precedent['date']} :")
+    for cle, mesures in courant["resultats"].items():
+        avant = precedent["resultats"].get(cle)
+        if not avant:
+            continue
+        ecarts = ", ".join(
+            f"{m} {100 * (mesures[m] - avant[m]) / avant[m]:+.0f}%"
+            for m in ("p50_ms", "p95_ms", "p99_ms", "debit_rps") if avant[m]
+        )
+        print(f"{cle:>32} : {ecarts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--serveur", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    parser.add_argument("--regions", type=int, default=13)
+    parser.add_argument("--epci", type=int, default=1250)
+    parser.add_argument("--usines", type=int, default=20000)
+    parser.add_argument("--requetes", type=int, default=200, help="requêtes mesurées par endpoint et concurrence")
+    parser.add_argument("--concurrence", type=int, nargs="+", default=[8])
+    parser.add_argument("--endpoints", nargs="+", help="sous-ensemble des endpoints (défaut : tous)")
+    parser.add_argument("--production", action="store_true", help="servir via wsgi.py (profil de production)")
+    parser.add_argument("--port", type=int, default=5077)
+    parser.add_argument("--sortie", default=os.path.join(ICI, "resultats_bench_charge.jsonl"))
+    parser.add_argument("--comparer", action="store_true", help="écart avec le run précédent de même configuration")
+    args = parser.parse_args()
+
+    if args.serveur:
+        servir(args.serveur, args.production)
+        return
+
+    config = {k: getattr(args, k) for k in ("regions", "epci", "usines", "requetes", "concurrence", "production")}
+    dossier = tempfile.mkdtemp(prefix="bench_charge_")
+    selections = preparer_donnees(dossier, args.regions, args.epci, args.usines)
+    env = dict(os.environ,
+               INSEE_DB_URL=f"sqlite:///{os.path.join(dossier, 'essai.db')}",
+               INSEE_DATA_ETRANGERS=os.path.join(dossier, "data_etrangers.geojson"),
+               DONNEES_INTERVALLE_S="0")
+    bases = {"insee": f"http://127.0.0.1:{args.port}", "usines": f"http://127.0.0.1:{PORT_USINES}"}
+    commande = [sys.executable, os.path.abspath(__file__), "--serveur", str(args.port)]
+    serveurs = {
+        "insee": lancer(commande + (["--production"] if args.production else []), ICI, env, bases["insee"]),
+        "usines": lancer([sys.executable, os.path.join(RACINE, "flask")], dossier, env, bases["usines"] + "/map"),
+    }
+    resultats = {}
+    try:
+        attendre_donnees(bases["insee"])
+        for nom, (serveur, tirage) in scenarios(selections).items():
+            if args.endpoints and nom not in args.endpoints:
+                continue
+            for concurrence in args.concurrence:
+                mesure = mesurer(bases[serveur], tirage, args.requetes, concurrence)
+                mesure["rss_mo"], mesure["rss_max_mo"] = memoire(serveurs[serveur].pid)
+                resultats[f"{nom}@{concurrence}"] = mesure
+                rss = f"{mesure['rss_max_mo']:.0f}" if mesure["rss_max_mo"] is not None else "?"
+                print(f"{nom + '@' + str(concurrence):>32} : p50 {mesure['p50_ms']:8.1f} ms  p95 {mesure['p95_ms']:8.1f} ms  "
+                      f"p99 {mesure['p99_ms']:8.1f} ms  {mesure['debit_rps']:7.1f} req/s  "
+                      f"{mesure['octets_moyens'] / 1e3:8.1f} Ko  RSS max {rss} Mo  erreurs {mesure['erreurs']}")
+    finally:
+        for processus in serveurs.values():
+            processus.terminate()
+            processus.wait()
+
+    run = {"commit": commit_courant(), "date": datetime.now().isoformat(timespec="seconds"),
+           "config": config, "resultats": resultats}
+    precedent = None
+    if os.path.exists(args.sortie):
+        with open(args.sortie, encoding="utf-8") as f:
+            runs = [json.loads(ligne) for ligne in f if ligne.strip()]
+        precedent = next((r for r in reversed(runs) if r["config"] == config), None)
+    with open(args.sortie, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run, ensure_ascii=False) + "\n")
+    print(f"Résultats ajoutés à {args.sortie}")
+    if args.comparer and precedent:
+        comparer(precedent, run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# bench_histogrammes.py
+"""Micro-benchmark des recherches de /get_epci et /get_data_plot sur toutes les paires région / EPCI.
+
+    python bench_histogrammes.py                          # base configurée par INSEE_DB_URL
+    python bench_histogrammes.py --synthetique 13 --epci 1250
+
+« avant » reproduit les anciens filtres (masque booléen sur tout agg_df, puis
+unique / sort_values à chaque appel) ; « après » interroge l'index précalculé.
+Seule la recherche est mesurée, pas le rendu Bokeh.
+"""
+import argparse
+import statistics
+import time
+
+import pandas as pd
+
+import histogrammes
+from donnees_synthetiques import tables_synthetiques
+
+
+def agg_synthetique(n_regions=13, n_epci=1250):
+    """agg_df tel que renvoyé par la requête agrégée, calculé en pandas sur les tables synthétiques."""
+    inat, _ = tables_synthetiques(n_regions, n_epci)
+    inat = inat.rename(columns={"nom": "epci_nom", "region_name": "region"})
+    inat["total_s"] = pd.to_numeric(inat["total_s"], errors="coerce")
+    inat = inat[inat["total_s"] > 0]
+    return inat.groupby(["region", "epci_nom", "NAT_rec3"], as_index=False)["total_s"].sum()
+
+
+def epcis_origine(agg_df, region):
+    return sorted(agg_df[agg_df["region"] == region]["epci_nom"].unique())
+
+
+def tranche_origine(agg_df, region, epci):
+    df_plot = agg_df[(agg_df["region"] == region) & (agg_df["epci_nom"] == epci)]
+    return df_plot.sort_values("total_s", ascending=True)
+
+
+def chrono(fonction, *args):
+    debut = time.perf_counter()
+    fonction(*args)
+    return time.perf_counter() - debut
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--synthetique", type=int, metavar="N_REGIONS", help="données synthétiques avec N régions")
+    parser.add_argument("--epci", type=int, default=1250)
+    args = parser.parse_args()
+
+    if args.synthetique:
+        histogrammes.jeu_histo.publier(histogrammes.preparer(agg_synthetique(args.synthetique, args.epci)))
+    agg_df = histogrammes.get_agg_df()
+    if agg_df.empty:
+        raise SystemExit("Pas de données (vérifier INSEE_DB_URL ou utiliser --synthetique)")
+    paires = list(agg_df[["region", "epci_nom"]].drop_duplicates().itertuples(index=False, name=None))
+    regions = sorted(agg_df["region"].unique())
+
+    index = chrono(histogrammes._indexer, agg_df)
+
+    def epcis_index(region):
+        return histogrammes.get_index_region(region)["epcis"]
+
+    def tranche_index(region, epci):
+        return histogrammes.get_index_region(region)["tranches"][epci]
+
+    # même résultat avant / après
+    for region, epci in paires[:50]:
+        assert epcis_index(region) == epcis_origine(agg_df, region)
+        attendu = tranche_origine(agg_df, region, epci)
+        assert tranche_index(region, epci)["total_s"].tolist() == attendu["total_s"].tolist()
+
+    mesures = {
+        "get_epci avant": [chrono(epcis_origine, agg_df, r) for r in regions],
+        "get_epci après": [chrono(epcis_index, r) for r in regions],
+        "get_data_plot avant": [chrono(tranche_origine, agg_df, r, e) for r, e in paires],
+        "get_data_plot après": [chrono(tranche_index, r, e) for r, e in paires],
+    }
+
+    print(f"{len(regions)} régions, {len(paires)} EPCI, {len(agg_df)} lignes ; "
+          f"construction de l'index : {index * 1000:.0f} ms")
+    for libelle, valeurs in mesures.items():
+        print(f"{libelle:>20} : médiane {statistics.median(valeurs) * 1e6:9.1f} µs, "
+              f"total {sum(valeurs) * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
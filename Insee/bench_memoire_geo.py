@@ -0,0 +1,112 @@
+# bench_memoire_geo.py
+"""Mémoire résidente du jeu « cartes » : table dénormalisée (avant) contre géométries + attributs (après).
+
+    python bench_memoire_geo.py                          # 1250 EPCI, 16 nationalités
+    python bench_memoire_geo.py --nationalites 60 --epci 1250
+
+La base SQLite synthétique répète, comme ``poisson.nat_etrg_par_epci``, le
+polygone de chaque EPCI sur chacune de ses lignes. Chaque variante est chargée
+dans un processus neuf (mêmes imports, même moteur SQL) : on relève le RSS
+(VmRSS, Linux) avant puis après chargement des données et construction de
+l'index par nationalité, ce que chaque worker garde en mémoire.
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Requête et index de l'ancienne version (une ligne, donc un polygone, par EPCI et nationalité)
+REQUETE_ORIGINE = """
+SELECT
+    "EPCI",
+    "nom_epci",
+    "NAT_rec3" AS "Nationalite",
+    "total_s",
+    "part_etrg_epci",
+    "geometry"
+FROM poisson.nat_etrg_par_epci
+"""
+
+
+def rss_mo():
+    with open("/proc/self/status") as f:
+        for ligne in f:
+            if ligne.startswith("VmRSS"):
+                return int(ligne.split()[1]) / 1024
+    return None
+
+
+def charger_origine():
+    from acces_donnees import lire_postgis
+    from simplification import simplifier_par_cle
+    brut = lire_postgis(REQUETE_ORIGINE, geom_col="geometry")
+    simple = simplifier_par_cle(brut, "EPCI", "national")
+    return brut, {nat: sous_gdf for nat, sous_gdf in simple.groupby("Nationalite", sort=True)}
+
+
+def charger_normalise():
+    import carte_nationalites_par_epci as carte_mod
+    carte_mod.get_index_nationalites()
+    return carte_mod.jeu_geo.get()
+
+
+def mesurer(variante):
+    """Dans le processus fils : RSS avant / après chargement de ``variante``."""
+    import carte_nationalites_par_epci  # noqa: F401  mêmes modules chargés dans les deux variantes
+    import geopandas  # noqa: F401
+    from acces_donnees import lire_sql
+    lire_sql("SELECT 1 AS n")
+    gc.collect()
+    avant = rss_mo()
+    debut = time.perf_counter()
+    donnees = charger_origine() if variante == "avant" else charger_normalise()
+    duree = time.perf_counter() - debut
+    gc.collect()
+    apres = rss_mo()
+    del donnees
+    return {"rss_base_mo": avant, "rss_donnees_mo": apres - avant, "duree_s": duree}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--variante", choices=["avant", "apres"], help=argparse.SUPPRESS)
+    parser.add_argument("--epci", type=int, default=1250)
+    parser.add_argument("--nationalites", type=int, default=None, help="nombre de nationalités (défaut : liste synthétique)")
+    args = parser.parse_args()
+
+    if args.variante:
+        print(json.dumps(mesurer(args.variante)))
+        return
+
+    import sqlite3
+    from donnees_synthetiques import NATIONALITES, tables_synthetiques
+    nationalites = NATIONALITES
+    if args.nationalites:
+        nationalites = (NATIONALITES + [f"Nationalité {i}" for i in range(args.nationalites)])[:args.nationalites]
+    dossier = tempfile.mkdtemp(prefix="bench_memoire_geo_")
+    chemin = os.path.join(dossier, "essai.db")
+    _, nat = tables_synthetiques(13, args.epci, nationalites)
+    with sqlite3.connect(chemin) as conn:
+        nat.to_sql("nat_etrg_par_epci", conn, if_exists="replace", index=False)
+    print(f"{args.epci} EPCI x {len(nationalites)} nationalités = {len(nat)} lignes")
+
+    env = dict(os.environ, INSEE_DB_URL=f"sqlite:///{chemin}")
+    resultats = {}
+    for variante in ("avant", "apres"):
+        sortie = subprocess.run([sys.executable, os.path.abspath(__file__), "--variante", variante],
+                                cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                                capture_output=True, text=True, check=True).stdout
+        resultats[variante] = json.loads(sortie.strip().splitlines()[-1])
+        r = resultats[variante]
+        print(f"{variante:>6} : +{r['rss_donnees_mo']:7.1f} Mo de RSS par worker "
+              f"(base {r['rss_base_mo']:.0f} Mo), chargement {r['duree_s']:.2f} s")
+    gain = resultats["avant"]["rss_donnees_mo"] - resultats["apres"]["rss_donnees_mo"]
+    print(f"Gain : {gain:.1f} Mo par worker")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# budget_demarrage.py
+"""Contrôle du temps d'import au démarrage (``python -X importtime``).
+
+    python budget_demarrage.py                  # échoue (code 1) si le budget est dépassé
+    python budget_demarrage.py --budget-ms 300 --details 20
+
+Pour chaque cible (création de l'application Insee avec tous ses blueprints,
+application d'histogrammes de la racine), l'import est mesuré dans un processus
+neuf. Le contrôle échoue si une bibliothèque lourde (pandas, Bokeh, folium,
+geopandas...) est importée au démarrage — elles doivent l'être au premier usage
+ou par ``wsgi.precharger`` — ou si le temps d'import total dépasse le budget
+(``--budget-ms``, défaut ``DEMARRAGE_BUDGET_MS`` ou 500 ms). Le meilleur de
+``--repetitions`` mesures est retenu pour limiter le bruit.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ICI = os.path.dirname(os.path.abspath(__file__))
+RACINE = os.path.dirname(ICI)
+
+MODULES_LOURDS = ("pandas", "numpy", "pyarrow", "geopandas", "shapely", "pyogrio", "folium", "branca",
+                  "bokeh", "sqlalchemy")
+
+# nom -> (dossier, code exécuté)
+CIBLES = {
+    "insee": (ICI, "from app import create_app; create_app(production=True)"),
+    "histogrammes_racine": (RACINE, "import histogrammes"),
+}
+
+_LIGNE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def mesurer(dossier, code):
+    """Temps d'import total (ms), modules importés et lignes (cumul µs, profondeur, module) de ``code``."""
+    env = dict(os.environ, DONNEES_PRECHAUFFAGE="0")
+    resultat = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=dossier, env=env,
+                              capture_output=True, text=True)
+    if resultat.returncode != 0:
+        raise RuntimeError(f"Échec de {code!r} :\n{resultat.stderr[-2000:]}")
+    total, modules, lignes = 0, set(), []
+    for ligne in resultat.stderr.splitlines():
+        m = _LIGNE.match(ligne)
+        if m:
+            propre, cumul, retrait, module = m.groups()
+            total += int(propre)
+            modules.add(module)
+            lignes.append((int(cumul), len(retrait) // 2, module))
+    return total / 1000, modules, lignes
+
+
+def controler(nom, dossier, code, budget_ms, repetitions, details):
+    try:
+        mesures = [mesurer(dossier, code) for _ in range(repetitions)]
+    except RuntimeError as e:
+        print(f"{nom:>20} : ÉCHEC\n{e}")
+        return False
+    total, modules, lignes = min(mesures, key=lambda m: m[0])
+    lourds = sorted({m.split(".")[0] for m in modules} & set(MODULES_LOURDS))
+    ok = total <= budget_ms and not lourds
+    print(f"{nom:>20} : {total:7.1f} ms d'import (budget {budget_ms:.0f} ms), {len(modules)} modules"
+          f"{'' if ok else '  ÉCHEC'}")
+    if lourds:
+        print(f"{'':>23}bibliothèques lourdes importées au démarrage : {', '.join(lourds)}")
+    for cumul, _, module in sorted((l for l in lignes if l[1] <= 1), reverse=True)[:details]:
+        print(f"{'':>23}{cumul / 1000:7.1f} ms  {module}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("DEMARRAGE_BUDGET_MS", "500")))
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--details", type=int, default=8, help="imports directs les plus coûteux à afficher")
+    parser.add_argument("--cibles", nargs="+", choices=list(CIBLES), default=list(CIBLES))
+    args = parser.parse_args()
+    resultats = [controler(nom, *CIBLES[nom], args.budget_ms, args.repetitions, args.details) for nom in args.cibles]
+    sys.exit(0 if all(resultats) else 1)
+
+
+if __name__ == "__main__":
+    main()
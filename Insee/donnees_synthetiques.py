@@ -0,0 +1,66 @@
+# donnees_synthetiques.py
+"""Base SQLite de substitution, remplie de données synthétiques, pour essayer les blueprints sans PostgreSQL.
+
+    python donnees_synthetiques.py essai.db --regions 13 --epci 1250
+    INSEE_DB_URL=sqlite:///essai.db python app.py
+
+Les tables ``inat_nat_epci_region`` et ``nat_etrg_par_epci`` reprennent les
+colonnes lues par histogrammes.py et carte_nationalites_par_epci.py ; les
+géométries sont stockées en WKB, que ``gpd.read_postgis`` sait relire.
+"""
+import argparse
+import sqlite3
+
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+
+NATIONALITES = [
+    "Portugal", "Algérie", "Maroc", "Tunisie", "Turquie", "Italie", "Espagne", "Royaume-Uni",
+    "Belgique", "Allemagne", "Roumanie", "Chine", "Sénégal", "Mali", "Côte d'Ivoire", "Autres",
+]
+
+
+def geometrie_epci(i, n_epci):
+    cote = int(np.ceil(np.sqrt(n_epci)))
+    x, y = i % cote, i // cote
+    return box(-4 + x * 0.25, 42 + y * 0.2, -4 + (x + 1) * 0.25, 42 + (y + 1) * 0.2).segmentize(0.01)
+
+
+def tables_synthetiques(n_regions=13, n_epci=1250, nationalites=NATIONALITES, seed=0):
+    """Renvoie (inat_nat_epci_region, nat_etrg_par_epci) sous forme de DataFrames."""
+    rng = np.random.default_rng(seed)
+    lignes_inat, lignes_nat = [], []
+    for i in range(n_epci):
+        code = str(200000000 + i)
+        nom = f"CC synthétique {i}"
+        region = f"Région {i * n_regions // n_epci}"
+        geom = geometrie_epci(i, n_epci).wkb
+        totaux = rng.integers(0, 500, len(nationalites)) * (rng.random(len(nationalites)) < 0.7)
+        total_etrg = max(int(totaux.sum()), 1)
+        for nat, total in zip(nationalites, totaux):
+            for inat in ("Etranger", "Français par acquisition"):
+                # total_s est stocké en texte dans la table source
+                lignes_inat.append((nom, code, region, inat, nat, str(int(total * (1 if inat == "Etranger" else 0.4)))))
+            lignes_nat.append((code, nom, nat, float(total), round(100 * total / total_etrg, 2), geom))
+    inat = pd.DataFrame(lignes_inat, columns=["nom", "EPCI", "region_name", "INAT_BIS", "NAT_rec3", "total_s"])
+    nat = pd.DataFrame(lignes_nat, columns=["EPCI", "nom_epci", "NAT_rec3", "total_s", "part_etrg_epci", "geometry"])
+    return inat, nat
+
+
+def creer_base_sqlite(chemin, n_regions=13, n_epci=1250, seed=0):
+    inat, nat = tables_synthetiques(n_regions, n_epci, seed=seed)
+    with sqlite3.connect(chemin) as conn:
+        inat.to_sql("inat_nat_epci_region", conn, if_exists="replace", index=False)
+        nat.to_sql("nat_etrg_par_epci", conn, if_exists="replace", index=False)
+    return chemin
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("chemin", nargs="?", default="essai.db")
+    parser.add_argument("--regions", type=int, default=13)
+    parser.add_argument("--epci", type=int, default=1250)
+    args = parser.parse_args()
+    creer_base_sqlite(args.chemin, args.regions, args.epci)
+    print(f"Base synthétique écrite : {args.chemin}")
@@ -0,0 +1,240 @@
+# export_statique.py
+"""Export statique de l'atlas (cartes régionales, cartes par nationalité, histogrammes par EPCI)
+pour un hébergement sans serveur (GitHub Pages, CDN).
+
+    python export_statique.py ../atlas                 # base configurée par INSEE_DB_URL
+    python export_statique.py ../atlas --workers 8 --complet
+
+Chaque vue est rendue dans son propre fichier (page HTML folium, ou JSON Bokeh
+pour les histogrammes), accompagné d'une copie ``.gz`` pour les serveurs qui
+servent les fichiers précompressés (nginx ``gzip_static``, la plupart des CDN).
+``manifest.json`` liste les vues avec l'empreinte de leurs données d'entrée :
+un nouvel export ne rend que les vues dont la tranche de données (ou la version
+du rendu) a changé, et supprime celles qui ont disparu. Les rendus sont répartis
+sur un pool de processus ; ``index.html`` et ``histogrammes.html`` sont régénérés
+à chaque export.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+from jinja2 import Environment, FileSystemLoader
+
+logging.basicConfig(level=logging.INFO)
+
+# à incrémenter quand le rendu change sans que les données changent
+RENDU_VERSION = 1
+
+
+def slug(texte):
+    ascii_ = unicodedata.normalize("NFKD", str(texte)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", ascii_.lower()).strip("-") or "vue"
+
+
+def fichier_vue(dossier, nom, identifiant, extension):
+    """Chemin relatif d'une vue : slug lisible suivi d'une empreinte courte de l'identifiant complet,
+    deux noms que ``slug`` confond (« Pays-de-X » / « Pays de X ») ne partagent donc pas de fichier."""
+    return f"{dossier}/{slug(nom)}-{_empreinte(identifiant)[:8]}{extension}"
+
+
+def _empreinte(*morceaux):
+    h = hashlib.sha1()
+    for morceau in morceaux:
+        h.update(morceau if isinstance(morceau, bytes) else str(morceau).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _empreinte_frame(df):
+    if "geometry" in df.columns:
+        geometries = b"".join(g.wkb if g is not None else b"" for g in df.geometry)
+        df = pd.DataFrame(df.drop(columns="geometry"))
+    else:
+        geometries = b""
+    return _empreinte(pd.util.hash_pandas_object(df, index=False).values.tobytes(), geometries, list(df.columns))
+
+
+def _versions_rendu():
+    import bokeh
+    import folium
+    return f"{RENDU_VERSION}|folium {folium.__version__}|bokeh {bokeh.__version__}"
+
+
+# --- Vues à rendre : (identifiant, fichier, empreinte, tâche) ---
+
+def vues_regions(versions):
+    import mon_graphique
+    index = mon_graphique.get_index_regions()
+    colormap = index["colormap"]
+    for region in index["regions"]:
+        entree = index["par_region"][region]
+        empreinte = _empreinte(versions, colormap.vmin, colormap.vmax,
+                               json.dumps(entree["geojson"], sort_keys=True))
+        # index réduit à la région : c'est lui qui est envoyé au processus de rendu
+        mini_index = {"colormap": colormap, "par_region": {region: entree}}
+        identifiant = f"region/{region}"
+        yield identifiant, fichier_vue("regions", region, identifiant, ".html"), empreinte, ("region", region, mini_index)
+
+
+def vues_nationalites(versions):
+    import carte_nationalites_par_epci as carte_mod
+    for nat in carte_mod.get_index_nationalites():
+        gdf = carte_mod.geo_nationalite(nat)
+        identifiant = f"nationalite/{nat}"
+        yield (identifiant, fichier_vue("nationalites", nat, identifiant, ".html"),
+               _empreinte(versions, _empreinte_frame(gdf)), ("nationalite", nat, gdf))
+
+
+def vues_histogrammes(versions):
+    import histogrammes as hist_mod
+    for region in hist_mod.get_regions():
+        entree = hist_mod.get_index_region(region)
+        if entree is None:
+            continue
+        for epci in entree["epcis"]:
+            df_plot = entree["tranches"][epci]
+            identifiant = f"histo/{region}/{epci}"
+            yield (identifiant, fichier_vue(f"histogrammes/{slug(region)}", epci, identifiant, ".json"),
+                   _empreinte(versions, _empreinte_frame(df_plot)), ("histo", epci, df_plot))
+
+
+# --- Rendu (dans les processus du pool) ---
+
+def _ecrire(chemin, contenu, gz):
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    for destination, octets in ((chemin, contenu), (chemin + ".gz", gzip.compress(contenu, 9) if gz else None)):
+        if octets is None:
+            continue
+        tmp = destination + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(octets)
+        os.replace(tmp, destination)
+
+
+def rendre_vue(tache, chemin, gz=True):
+    """Rend une vue et l'écrit dans ``chemin`` ; renvoie la taille non compressée."""
+    genre, cle, donnees = tache
+    if genre == "region":
+        import mon_graphique
+        contenu = mon_graphique.carte_region(donnees, cle).get_root().render().encode("utf-8")
+    elif genre == "nationalite":
+        import carte_nationalites_par_epci as carte_mod
+        contenu = carte_mod.construire_carte(cle, donnees).get_root().render().encode("utf-8")
+    else:
+        import histogrammes as hist_mod
+        corps_gzip, _ = hist_mod.rendre_payload(donnees)
+        contenu = gzip.decompress(corps_gzip)
+    _ecrire(chemin, contenu, gz)
+    return len(contenu)
+
+
+def _rendre(args):
+    return rendre_vue(*args)
+
+
+# --- Export ---
+
+def _pages(dossier, manifest):
+    env = Environment(loader=FileSystemLoader(os.path.dirname(os.path.abspath(__file__))), autoescape=True)
+    from bokeh.resources import Resources
+    contexte = {
+        "manifest": manifest,
+        "regions": sorted((v["nom"], v["fichier"]) for v in manifest["vues"].values() if v["genre"] == "region"),
+        "nationalites": sorted((v["nom"], v["fichier"]) for v in manifest["vues"].values() if v["genre"] == "nationalite"),
+        "n_histogrammes": sum(len(e) for e in manifest["histogrammes"].values()),
+        "bokeh_js": Resources(mode="cdn").render_js(),
+    }
+    for gabarit, sortie in (("atlas_index.html", "index.html"), ("atlas_histogrammes.html", "histogrammes.html")):
+        contenu = env.get_template(gabarit).render(**contexte).encode("utf-8")
+        _ecrire(os.path.join(dossier, sortie), contenu, gz=True)
+
+
+def exporter(dossier, workers=None, complet=False, gz=True, genres=("region", "nationalite", "histo")):
+    debut = time.perf_counter()
+    chemin_manifest = os.path.join(dossier, "manifest.json")
+    ancien = {}
+    if os.path.exists(chemin_manifest) and not complet:
+        with open(chemin_manifest, encoding="utf-8") as f:
+            ancien = json.load(f).get("vues", {})
+
+    versions = _versions_rendu()
+    sources = {"region": vues_regions, "nationalite": vues_nationalites, "histo": vues_histogrammes}
+    # genres non demandés : vues de l'export précédent conservées
+    vues = {k: v for k, v in ancien.items() if v["genre"] not in genres}
+    a_rendre = []
+    for genre in genres:
+        try:
+            for identifiant, fichier, empreinte, tache in sources[genre](versions):
+                vues[identifiant] = {"genre": genre, "nom": identifiant.split("/", 1)[1], "fichier": fichier,
+                                     "empreinte": empreinte}
+                precedent = ancien.get(identifiant)
+                if (precedent is None or precedent["empreinte"] != empreinte
+                        or not os.path.exists(os.path.join(dossier, fichier))):
+                    a_rendre.append((identifiant, (tache, os.path.join(dossier, fichier), gz)))
+                else:
+                    vues[identifiant]["octets"] = precedent.get("octets")
+        except Exception as e:
+            logging.warning('Could not list %s views: %s', genre, e)
+            # vues de ce genre conservées telles quelles plutôt que supprimées
+            vues.update({k: v for k, v in ancien.items() if v["genre"] == genre})
+
+    # une vue ne doit jamais en écraser une autre
+    proprietaires = {}
+    for identifiant, vue in vues.items():
+        autre = proprietaires.setdefault(vue["fichier"], identifiant)
+        if autre != identifiant:
+            raise ValueError(f"Vues {autre!r} et {identifiant!r} : même fichier {vue['fichier']}")
+
+    logging.info('%d vues, %d à rendre', len(vues), len(a_rendre))
+    if a_rendre:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tailles = pool.map(_rendre, [args for _, args in a_rendre], chunksize=8)
+            for (identifiant, _), taille in zip(a_rendre, tailles):
+                vues[identifiant]["octets"] = taille
+
+    # vues disparues ou renommées : fichiers supprimés, sauf s'ils appartiennent à une vue actuelle
+    for identifiant, vue in ancien.items():
+        if vue["fichier"] not in proprietaires:
+            for extension in ("", ".gz"):
+                chemin = os.path.join(dossier, vue["fichier"] + extension)
+                if os.path.exists(chemin):
+                    os.remove(chemin)
+
+    histogrammes = {}
+    for identifiant, vue in vues.items():
+        if vue["genre"] == "histo":
+            region, epci = vue["nom"].split("/", 1)
+            histogrammes.setdefault(region, {})[epci] = vue["fichier"]
+    manifest = {
+        "genere_le": datetime.now().isoformat(timespec="seconds"),
+        "rendu": versions,
+        "vues": vues,
+        # pour histogrammes.html : région -> EPCI -> fichier JSON
+        "histogrammes": {r: dict(sorted(e.items())) for r, e in sorted(histogrammes.items())},
+    }
+    os.makedirs(dossier, exist_ok=True)
+    _ecrire(chemin_manifest, json.dumps(manifest, ensure_ascii=False, indent=1).encode("utf-8"), gz)
+    _pages(dossier, manifest)
+    logging.info('Export terminé en %.1f s : %d vues rendues, %d inchangées',
+                 time.perf_counter() - debut, len(a_rendre), len(vues) - len(a_rendre))
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("dossier", nargs="?", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "atlas"))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--complet", action="store_true", help="tout rendre, sans tenir compte de l'export précédent")
+    parser.add_argument("--sans-gz", action="store_true", help="ne pas écrire les copies .gz")
+    parser.add_argument("--genres", nargs="+", choices=["region", "nationalite", "histo"],
+                        default=["region", "nationalite", "histo"])
+    args = parser.parse_args()
+    exporter(args.dossier, args.workers, args.complet, not args.sans_gz, tuple(args.genres))
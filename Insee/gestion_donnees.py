@@ -0,0 +1,229 @@
+# gestion_donnees.py
+"""Gestion des jeux de données gardés en mémoire par les blueprints (agrégats des histogrammes,
+GeoDataFrame des nationalités, carte régionale).
+
+Chaque jeu est chargé une seule fois même sous requêtes concurrentes : les
+requêtes arrivées pendant un chargement attendent son résultat. Une nouvelle
+version est construite à côté de l'ancienne et publiée d'un seul coup, les
+lecteurs voient donc soit l'ancienne soit la nouvelle, jamais un état partiel.
+Un échec de chargement conserve la version précédente (ou un résultat vide au
+premier chargement) et sera retenté après ``DONNEES_RETENTER_S`` secondes.
+Un jeu enregistré avec ``prechauffage=False`` n'est chargé qu'à sa première lecture.
+
+Variables d'environnement :
+
+- ``DONNEES_PRECHAUFFAGE`` : ``0`` pour ne pas charger les jeux au démarrage (défaut ``1``) ;
+- ``DONNEES_INTERVALLE_S`` : période de surveillance des signaux de changement
+  (nombre de lignes d'une table, date de modification d'un fichier), ``0`` pour la désactiver (défaut 300) ;
+- ``DONNEES_RETENTER_S`` : délai avant de retenter un chargement en échec (défaut 30).
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import etape
+
+logging.basicConfig(level=logging.INFO)
+
+
+def signal_table(table, schema="poisson"):
+    """Signal de changement d'une table : nombre de lignes (et compteurs de modifications sous PostgreSQL)."""
+    from acces_donnees import get_engine, lire_sql
+
+    def _signal():
+        nombre = lire_sql(f'SELECT COUNT(*) AS n FROM {schema}.{table}')["n"].iloc[0]
+        if get_engine().dialect.name != "postgresql":
+            return int(nombre)
+        modifs = lire_sql("SELECT n_tup_ins + n_tup_upd + n_tup_del AS n FROM pg_stat_user_tables "
+                          "WHERE schemaname = :schema AND relname = :table", {"schema": schema, "table": table})
+        return int(nombre), int(modifs["n"].iloc[0]) if not modifs.empty else None
+    return _signal
+
+
+def signal_fichier(chemin):
+    """Signal de changement d'un fichier : date de modification et taille."""
+    def _signal():
+        try:
+            etat = os.stat(chemin)
+        except FileNotFoundError:
+            return None
+        return etat.st_mtime_ns, etat.st_size
+    return _signal
+
+
+class JeuDeDonnees:
+    """Un jeu de données chargé à la demande, rechargeable, avec version et durée du dernier chargement."""
+
+    def __init__(self, nom, charger, vide=None, signal=None, prechauffage=True):
+        self.nom = nom
+        self._charger = charger
+        self._vide = vide
+        self._signal = signal
+        self.prechauffage = prechauffage
+        self._valeur = None
+        self._signal_charge = None
+        self._lock = threading.Lock()
+        self._en_cours = None
+        self._abonnes = []
+        self.version = 0
+        self.charge_le = None
+        self.duree_chargement = None
+        self.erreur = None
+        self._echec_le = None
+
+    def get(self):
+        if self.version:
+            return self._valeur
+        retenter = float(os.environ.get("DONNEES_RETENTER_S", "30"))
+        if self._echec_le is None or time.monotonic() - self._echec_le >= retenter:
+            self._charger_une_fois()
+        if self.version:
+            return self._valeur
+        return self._vide() if self._vide is not None else None
+
+    def instantane(self):
+        """(version, valeur) cohérents entre eux ; version 0 (et valeur vide) tant qu'aucun chargement n'a réussi.
+
+        Les caches dérivés s'indexent sur cette version plutôt que de tenir un verrou pendant ``get()`` :
+        un chargement en cours dans un autre thread notifie les abonnés, qui ne doivent rien attendre.
+        """
+        valeur = self.get()
+        with self._lock:
+            if self.version:
+                return self.version, self._valeur
+        return 0, valeur
+
+    def abonner(self, fonction):
+        """``fonction()`` sera appelée après chaque nouvelle version (pour vider les caches qui en dérivent)."""
+        self._abonnes.append(fonction)
+        return fonction
+
+    def publier(self, valeur, signal=None):
+        """Remplace la version courante par ``valeur``."""
+        with self._lock:
+            self._valeur = valeur
+            self._signal_charge = signal
+            self.version += 1
+            self.charge_le = time.time()
+            self.erreur = None
+            self._echec_le = None
+        for fonction in self._abonnes:
+            try:
+                fonction()
+            except Exception as e:
+                logging.warning('Could not invalidate caches derived from %s: %s', self.nom, e)
+
+    def a_change(self):
+        """Vrai si le signal a évolué depuis le dernier chargement (toujours vrai sans signal)."""
+        if self._signal is None:
+            return True
+        try:
+            return self._signal() != self._signal_charge
+        except Exception as e:
+            logging.warning('Could not read change signal for %s: %s', self.nom, e)
+            return False
+
+    def rafraichir(self):
+        """Recharge le jeu ; les lecteurs continuent d'utiliser l'ancienne version jusqu'à la publication."""
+        self._charger_une_fois()
+        return self.erreur is None
+
+    def _charger_une_fois(self):
+        with self._lock:
+            evenement = self._en_cours
+            if evenement is None:
+                self._en_cours = threading.Event()
+        if evenement is not None:
+            # un chargement est déjà en cours : attendre son résultat
+            evenement.wait()
+            return
+        try:
+            self._executer()
+        finally:
+            with self._lock:
+                self._en_cours.set()
+                self._en_cours = None
+
+    def _executer(self):
+        debut = time.perf_counter()
+        try:
+            # signal lu avant le chargement : un changement pendant le chargement déclenchera un nouveau rechargement
+            with etape(f"chargement_{self.nom}"):
+                signal = self._signal() if self._signal is not None else None
+                valeur = self._charger()
+        except Exception as e:
+            logging.warning('Could not load dataset %s: %s', self.nom, e)
+            with self._lock:
+                self.erreur = str(e)
+                self._echec_le = time.monotonic()
+            return
+        self.duree_chargement = time.perf_counter() - debut
+        self.publier(valeur, signal)
+        logging.info('Jeu %s chargé (version %d) en %.2f s', self.nom, self.version, self.duree_chargement)
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "charge_le": self.charge_le,
+            "duree_chargement_s": self.duree_chargement,
+            "erreur": self.erreur,
+            "en_cours": self._en_cours is not None,
+        }
+
+
+class GestionnaireDonnees:
+    """Registre des jeux de données : préchauffage parallèle et surveillance des changements."""
+
+    def __init__(self):
+        self.jeux = {}
+        self._surveillance = None
+
+    def enregistrer(self, jeu):
+        self.jeux[jeu.nom] = jeu
+        return jeu
+
+    def prechauffer(self, workers=4):
+        jeux = [jeu for jeu in self.jeux.values() if jeu.prechauffage]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(JeuDeDonnees.get, jeux))
+        logging.info('Jeux de données préchauffés : %s', ", ".join(jeu.nom for jeu in jeux))
+
+    def verifier(self):
+        """Recharge les jeux déjà chargés dont le signal a changé."""
+        for jeu in list(self.jeux.values()):
+            if jeu.version and jeu.a_change():
+                logging.info('Changement détecté pour %s, rechargement', jeu.nom)
+                jeu.rafraichir()
+
+    def demarrer(self, prechauffage=None):
+        """Préchauffage et surveillance en arrière-plan (une seule fois par processus)."""
+        # après un fork, le fil du parent n'existe plus dans l'enfant (is_alive() est faux)
+        if self._surveillance is not None and self._surveillance.is_alive():
+            return
+        intervalle = float(os.environ.get("DONNEES_INTERVALLE_S", "300"))
+        if prechauffage is None:
+            prechauffage = os.environ.get("DONNEES_PRECHAUFFAGE", "1") != "0"
+
+        def _run():
+            if prechauffage:
+                try:
+                    self.prechauffer()
+                except Exception as e:
+                    logging.warning('Could not warm datasets: %s', e)
+            while intervalle > 0:
+                time.sleep(intervalle)
+                try:
+                    self.verifier()
+                except Exception as e:
+                    logging.warning('Could not check datasets for changes: %s', e)
+
+        self._surveillance = threading.Thread(target=_run, daemon=True, name="gestion_donnees")
+        self._surveillance.start()
+
+    def stats(self):
+        return {nom: jeu.stats() for nom, jeu in self.jeux.items()}
+
+
+gestionnaire = GestionnaireDonnees()
@@ -0,0 +1,23 @@
+# gunicorn.conf.py
+"""Configuration gunicorn du profil de production (cf. wsgi.py).
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("INSEE_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("INSEE_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("INSEE_THREADS", "4"))
+# application (et données) chargée une fois dans le maître, puis partagée par fork
+preload_app = True
+timeout = 120
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    # les connexions du pool et le fil de surveillance des données ne survivent pas au fork
+    from acces_donnees import reinitialiser
+    from gestion_donnees import gestionnaire
+    reinitialiser(fermer=False)
+    gestionnaire.demarrer(prechauffage=False)
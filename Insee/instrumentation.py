@@ -0,0 +1,222 @@
+# instrumentation.py
+"""Mesures par requête pour l'application Insee et le serveur de carte des usines.
+
+    from instrumentation import etape, installer
+    installer(app, prefixe="insee")
+
+    with etape("folium"):
+        ...
+
+- chaque ``etape`` est chronométrée ; les durées de la requête en cours sont
+  renvoyées dans l'en-tête ``Server-Timing`` (onglet Réseau du navigateur) ;
+- ``/metrics`` expose au format texte Prometheus les histogrammes de durée des
+  requêtes (par endpoint et statut) et des étapes, plus d'éventuelles jauges ;
+- profileur par échantillonnage, désactivé par défaut : avec ``PROFIL_SEUIL_MS``,
+  la pile des threads en cours de requête est relevée toutes les
+  ``PROFIL_INTERVALLE_MS`` (5 ms) et les requêtes plus longues que le seuil sont
+  écrites dans ``PROFIL_DOSSIER`` (``profils``) au format « folded »
+  (flamegraph.pl, speedscope, inferno).
+
+Les métriques sont propres au processus (un jeu par worker gunicorn).
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+logging.basicConfig(level=logging.INFO)
+
+BORNES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogramme:
+    def __init__(self):
+        self.compteurs = [0] * len(BORNES)
+        self.somme = 0.0
+        self.nombre = 0
+
+    def observer(self, duree):
+        self.somme += duree
+        self.nombre += 1
+        for i, borne in enumerate(BORNES):
+            if duree <= borne:
+                self.compteurs[i] += 1
+
+
+_lock = threading.Lock()
+_requetes = defaultdict(Histogramme)  # (endpoint, méthode, statut) -> durées
+_etapes = defaultdict(Histogramme)  # étape -> durées
+_jauges = []
+
+
+@contextmanager
+def etape(nom):
+    """Chronomètre le bloc ; la durée s'ajoute aux métriques et, dans une requête, à son Server-Timing."""
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        duree = time.perf_counter() - debut
+        with _lock:
+            _etapes[nom].observer(duree)
+        if has_request_context():
+            etapes = g.setdefault("etapes", {})
+            etapes[nom] = etapes.get(nom, 0.0) + duree
+
+
+def ajouter_jauges(fonction):
+    """``fonction()`` renvoie des (nom, étiquettes, valeur) ajoutés à /metrics."""
+    _jauges.append(fonction)
+    return fonction
+
+
+# --- Profileur par échantillonnage ---
+
+def _pile(frame):
+    noms = []
+    while frame is not None:
+        code = frame.f_code
+        noms.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(noms))
+
+
+class Profileur:
+    """Un seul fil d'échantillonnage pour tous les threads en cours de requête."""
+
+    def __init__(self, seuil_ms, intervalle_ms=5, dossier="profils"):
+        self.seuil = seuil_ms / 1000
+        self.intervalle = intervalle_ms / 1000
+        self.dossier = dossier
+        self._piles = {}
+        self._lock = threading.Lock()
+        self._fil = None
+
+    def commencer(self):
+        with self._lock:
+            self._piles[threading.get_ident()] = Counter()
+            if self._fil is None or not self._fil.is_alive():
+                self._fil = threading.Thread(target=self._boucle, daemon=True, name="profileur")
+                self._fil.start()
+
+    def terminer(self):
+        with self._lock:
+            return self._piles.pop(threading.get_ident(), None)
+
+    def _boucle(self):
+        while True:
+            time.sleep(self.intervalle)
+            frames = sys._current_frames()
+            with self._lock:
+                for tid, piles in self._piles.items():
+                    frame = frames.get(tid)
+                    if frame is not None:
+                        piles[_pile(frame)] += 1
+
+    def ecrire(self, piles, endpoint, duree):
+        os.makedirs(self.dossier, exist_ok=True)
+        nom = re.sub(r"[^\w.-]", "_", endpoint or "inconnu")
+        chemin = os.path.join(self.dossier, f"{time.strftime('%Y%m%d-%H%M%S')}_{nom}_{duree * 1000:.0f}ms.folded")
+        with open(chemin, "w", encoding="utf-8") as f:
+            for pile, n in piles.most_common():
+                f.write(f"{pile} {n}\n")
+        logging.info('Profil écrit : %s (%d échantillons)', chemin, sum(piles.values()))
+
+
+def _profileur_depuis_env():
+    seuil = os.environ.get("PROFIL_SEUIL_MS")
+    if not seuil:
+        return None
+    return Profileur(float(seuil), float(os.environ.get("PROFIL_INTERVALLE_MS", "5")),
+                     os.environ.get("PROFIL_DOSSIER", "profils"))
+
+
+# --- Export Prometheus ---
+
+def _echapper(valeur):
+    # format texte Prometheus : \\, \" et \n dans les valeurs d'étiquettes
+    return str(valeur).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquettes(valeurs):
+    return ",".join(f'{cle}="{_echapper(v)}"' for cle, v in valeurs.items())
+
+
+def _lignes_histogramme(nom, aide, series):
+    lignes = [f"# HELP {nom} {aide}", f"# TYPE {nom} histogram"]
+    for etiquettes, h in series:
+        base = _etiquettes(etiquettes)
+        sep = "," if base else ""
+        for borne, n in zip(BORNES, h.compteurs):
+            lignes.append(f'{nom}_bucket{{{base}{sep}le="{borne}"}} {n}')
+        lignes.append(f'{nom}_bucket{{{base}{sep}le="+Inf"}} {h.nombre}')
+        lignes.append(f"{nom}_sum{{{base}}} {h.somme}")
+        lignes.append(f"{nom}_count{{{base}}} {h.nombre}")
+    return lignes
+
+
+def metriques(prefixe):
+    with _lock:
+        requetes = [({"endpoint": e, "methode": m, "statut": s}, h) for (e, m, s), h in sorted(_requetes.items())]
+        etapes = [({"etape": nom}, h) for nom, h in sorted(_etapes.items())]
+        lignes = _lignes_histogramme(f"{prefixe}_requete_duree_secondes", "Durée des requêtes", requetes)
+        lignes += _lignes_histogramme(f"{prefixe}_etape_duree_secondes", "Durée des étapes instrumentées", etapes)
+    for fonction in _jauges:
+        try:
+            for nom, etiquettes, valeur in fonction():
+                if valeur is not None:
+                    lignes.append(f"{prefixe}_{nom}{{{_etiquettes(etiquettes)}}} {valeur}")
+        except Exception as e:
+            logging.warning('Could not collect gauges: %s', e)
+    return "\n".join(lignes) + "\n"
+
+
+def installer(app, prefixe):
+    """Ajoute les chronomètres de requête, l'en-tête Server-Timing, /metrics et le profileur à ``app``."""
+    profileur = _profileur_depuis_env()
+
+    @app.before_request
+    def _debut_requete():
+        g.debut_requete = time.perf_counter()
+        if profileur is not None:
+            profileur.commencer()
+
+    @app.after_request
+    def _fin_requete(response):
+        debut = g.get("debut_requete")
+        if debut is None:
+            return response
+        duree = time.perf_counter() - debut
+        g.duree_requete = duree
+        with _lock:
+            _requetes[(request.endpoint or "inconnu", request.method, response.status_code)].observer(duree)
+        mesures = [f"{nom};dur={d * 1000:.1f}" for nom, d in g.get("etapes", {}).items()]
+        mesures.append(f"total;dur={duree * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(mesures)
+        return response
+
+    @app.teardown_request
+    def _profil(exc):
+        if profileur is None:
+            return
+        piles = profileur.terminer()
+        duree = g.get("duree_requete")
+        if duree is None and g.get("debut_requete") is not None:
+            duree = time.perf_counter() - g.debut_requete
+        if piles and duree is not None and duree >= profileur.seuil:
+            try:
+                profileur.ecrire(piles, request.endpoint, duree)
+            except OSError as e:
+                logging.warning('Could not write profile: %s', e)
+
+    def _metrics():
+        return Response(metriques(prefixe), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metrics", _metrics)
+    return app
@@ -1,66 +1,155 @@
 from flask import Blueprint, render_template, request, jsonify
-import folium
-import geopandas as gpd
-import branca
+import copy
+import json
 import os
+import threading
+
+from gestion_donnees import JeuDeDonnees, gestionnaire, signal_fichier
+from instrumentation import etape
+from simplification import charger_niveau
 
 # Ce module fournit désormais la carte régionale précédemment dans app_carte_region.py
 bp = Blueprint('mongraph', __name__, template_folder='templates', static_folder='static')
 
-# Charger les données une seule fois (peut être modifié en chargement paresseux si l'import est trop lent)
-DATA_PATH = os.path.join(os.path.dirname(__file__), 'data_etrangers.geojson')
-try:
-    data = gpd.read_file(DATA_PATH)
-except Exception:
-    # Si le chargement à l'import échoue, le différer au moment de la route et définir data à None
-    data = None
+# Vue par région : géométries simplifiées au niveau régional (cf. simplification.py)
+DATA_PATH = os.environ.get('INSEE_DATA_ETRANGERS', os.path.join(os.path.dirname(__file__), 'data_etrangers.geojson'))
+NIVEAU = 'regional'
 
+# Données chargées par le gestionnaire (préchauffage au démarrage, rechargement si le fichier change)
+jeu_etrangers = gestionnaire.enregistrer(JeuDeDonnees(
+    "etrangers", lambda: charger_niveau(DATA_PATH, NIVEAU), signal=signal_fichier(DATA_PATH),
+))
 
-def build_map(region_selected=None):
-    # S'assurer que les données sont disponibles
-    global data
+
+def get_data():
+    """GeoDataFrame courant (None si le chargement a échoué)."""
+    return jeu_etrangers.get()
+
+
+# Index des régions construit une fois par version des données : GeoJSON pré-sérialisé (couleurs incluses)
+# et emprise par région. Couple (version, index), remplacé d'un bloc.
+_index_regions = None
+_index_lock = threading.Lock()  # un seul calcul de l'index à la fois ; jamais pris pendant le chargement des données
+# HTML déjà rendu par (version, région) : un changement de région devient une simple lecture de dictionnaire
+_html_par_region = {}
+
+
+def _style_function(feature):
+    return {
+        'fillColor': feature['properties']['fillColor'],
+        'color': 'black',
+        'weight': 1,
+        'fillOpacity': 0.7,
+    }
+
+
+def _entree(gdf):
+    return {
+        'bounds': tuple(gdf.total_bounds),
+        'geojson': json.loads(gdf.to_json(drop_id=True)),
+    }
+
+
+def get_index_regions():
+    """Construit (une fois par version des données) la liste des régions, la colormap et l'entrée pré-calculée de chaque région."""
+    global _index_regions
+    # Données lues hors du verrou : leur chargement notifie vider_cache, qui ne doit rien attendre
+    version, data = jeu_etrangers.instantane()
+    courant = _index_regions
+    if courant is not None and courant[0] == version:
+        return courant[1]
     if data is None:
-        data = gpd.read_file(DATA_PATH)
+        raise RuntimeError(f"Données indisponibles : {DATA_PATH}")
+
+    with _index_lock:
+        courant = _index_regions
+        if courant is not None and courant[0] >= version:
+            return courant[1]
+
+        import branca
+        import pandas as pd
+
+        # Choroplèthe / colormap, calculée sur la France entière
+        colormap = branca.colormap.linear.YlOrRd_09.scale(data['Pct_Etranger'].min(), data['Pct_Etranger'].max())
+        colormap.caption = '% Étrangers'
+        colore = data.assign(fillColor=data['Pct_Etranger'].map(lambda pct: colormap(pct) if pd.notna(pct) else 'gray'))
+
+        par_region = {region: _entree(gdf_region) for region, gdf_region in colore.groupby('region_name', sort=False)}
+        index = {
+            'version': version,
+            'regions': list(par_region),
+            'colormap': colormap,
+            'par_region': par_region,
+            'donnees': colore,
+        }
+        _index_regions = (version, index)
+    return index
+
+
+def vider_cache():
+    """À appeler après un rechargement des données (abonné au jeu : ne prend aucun verrou)."""
+    global _index_regions
+    _index_regions = None
+    _html_par_region.clear()
 
-    regions = data['region_name'].unique().tolist()
-    if region_selected is None or region_selected not in regions:
-        region_selected = regions[0] if regions else None
 
-    gdf_region = data[data['region_name'] == region_selected] if region_selected else data
+jeu_etrangers.abonner(vider_cache)
+
+
+def carte_region(index, region_selected):
+    """Carte folium d'une région (ou de la France entière si ``region_selected`` est None)."""
+    import folium
+
+    if region_selected is None:
+        entree = _entree(index['donnees'])
+    else:
+        entree = index['par_region'][region_selected]
 
     # Calculer le centre et les limites
-    minx, miny, maxx, maxy = gdf_region.total_bounds
+    minx, miny, maxx, maxy = entree['bounds']
     center_lat = (miny + maxy) / 2
     center_lon = (minx + maxx) / 2
 
-    m = folium.Map(location=[center_lat, center_lon], zoom_start=6)
-    m.fit_bounds([[miny, minx], [maxy, maxx]])
-
-    # Choroplèthe / colormap
-    colormap = branca.colormap.linear.YlOrRd_09.scale(data['Pct_Etranger'].min(), data['Pct_Etranger'].max())
-    colormap.caption = '% Étrangers'
-    colormap.add_to(m)
-
-    def style_function(feature):
-        pct = feature['properties'].get('Pct_Etranger')
-        return {
-            'fillColor': colormap(pct) if pct is not None else 'gray',
-            'color': 'black',
-            'weight': 1,
-            'fillOpacity': 0.7,
-        }
+    with etape('folium'):
+        m = folium.Map(location=[center_lat, center_lon], zoom_start=6)
+        m.fit_bounds([[miny, minx], [maxy, maxx]])
+
+        # copie par carte : add_to rattache la légende à la carte (_parent), la colormap de l'index reste partagée
+        copy.deepcopy(index['colormap']).add_to(m)
+
+        folium.GeoJson(
+            entree['geojson'],
+            style_function=_style_function,
+            tooltip=folium.GeoJsonTooltip(
+                fields=['nom', 'Pct_Etranger_str', 'top3_nationalites'],
+                aliases=['EPCI:', 'Pct étrangers:', 'Top 3 nationalités:'],
+                localize=True
+            )
+        ).add_to(m)
+
+    return m
+
+
+def _rendre_region(index, region_selected):
+    m = carte_region(index, region_selected)
+    with etape('repr_html'):
+        return m._repr_html_()
+
+
+def build_map(region_selected=None):
+    with etape('index_regions'):
+        index = get_index_regions()
+    regions = index['regions']
+    if region_selected is None or region_selected not in regions:
+        region_selected = regions[0] if regions else None
+
+    cle = (index['version'], region_selected)
+    map_html = _html_par_region.get(cle)
+    if map_html is None:
+        map_html = _rendre_region(index, region_selected)
+        _html_par_region[cle] = map_html
 
-    folium.GeoJson(
-        gdf_region,
-        style_function=style_function,
-        tooltip=folium.GeoJsonTooltip(
-            fields=['nom', 'Pct_Etranger_str', 'top3_nationalites'],
-            aliases=['EPCI:', 'Pct étrangers:', 'Top 3 nationalités:'],
-            localize=True
-        )
-    ).add_to(m)
-
-    return m._repr_html_(), regions, region_selected
+    return map_html, regions, region_selected
 
 
 @bp.route('/', methods=['GET', 'POST'])
@@ -0,0 +1,46 @@
+# reponses_http.py
+"""Réponses HTTP communes aux blueprints : négociation gzip, ETag et en-têtes de cache.
+
+    from reponses_http import reponse_gzip
+    return reponse_gzip(corps_gzip)                      # URL non versionnée : revalidation (no-cache)
+    return reponse_gzip(corps_gzip, max_age=86400)       # URL qui change avec les données
+
+Les corps sont gardés compressés en mémoire et décompressés pour les clients qui
+refusent gzip (qualités de ``Accept-Encoding`` respectées, ``gzip;q=0`` compris).
+Les deux représentations d'une même URL ont chacune leur ETag (suffixe
+``-gzip`` / ``-identity``) et portent toujours ``Vary: Accept-Encoding``, 304 compris.
+"""
+import gzip
+import hashlib
+
+from flask import make_response, request
+
+
+def encodage_accepte():
+    """``"gzip"`` si le client accepte gzip (qualité non nulle), sinon ``"identity"``."""
+    return "gzip" if request.accept_encodings["gzip"] else "identity"
+
+
+def reponse_gzip(corps_gzip, etag=None, max_age=None, type_contenu="application/json"):
+    """Réponse 200, ou 304 si l'ETag du client correspond, pour un corps déjà compressé en gzip.
+
+    ``etag`` : empreinte du contenu (sha1 du corps compressé par défaut).
+    ``max_age`` : None pour ``no-cache`` (le navigateur garde la réponse mais la revalide) ;
+    une durée n'est sûre que si l'URL change avec les données.
+    """
+    if etag is None:
+        etag = hashlib.sha1(corps_gzip).hexdigest()
+    encodage = encodage_accepte()
+    etag = f"{etag}-{encodage}"
+    entetes = {
+        "Cache-Control": "no-cache" if max_age is None else f"public, max-age={max_age}",
+        "ETag": f'"{etag}"',
+        "Vary": "Accept-Encoding",
+    }
+    if request.if_none_match.contains(etag):
+        return make_response("", 304, entetes)
+    entetes["Content-Type"] = type_contenu
+    if encodage == "gzip":
+        entetes["Content-Encoding"] = "gzip"
+        return make_response(corps_gzip, 200, entetes)
+    return make_response(gzip.decompress(corps_gzip), 200, entetes)
@@ -0,0 +1,129 @@
+# simplification.py
+"""Simplification des géométries EPCI par niveau de zoom, en conservant la topologie.
+
+Les EPCI forment une couverture (polygones jointifs) : ils sont simplifiés
+ensemble avec ``shapely.coverage_simplify``, si bien qu'une frontière commune
+est simplifiée une seule fois et reste partagée (pas de trous ni de
+chevauchements entre EPCI voisins). Les coordonnées sont ensuite arrondies sur
+une grille commune (``set_precision``), ce qui conserve aussi les sommets partagés.
+
+Les pages choisissent leur niveau : ``national`` pour la France entière,
+``regional`` pour une région, ``local`` et ``detail`` pour les zooms proches.
+
+    python simplification.py data_etrangers.geojson [--topojson]
+
+écrit ``data_etrangers_<niveau>.geojson`` (et ``.topojson`` si le paquet
+optionnel ``topojson`` est installé) pour chaque niveau.
+"""
+import logging
+import os
+
+# geopandas et shapely sont importés dans les fonctions : importer NIVEAUX ou niveau_pour_zoom reste léger
+logging.basicConfig(level=logging.INFO)
+
+# Tolérance de simplification (mètres, en Lambert-93) et précision des coordonnées (degrés)
+NIVEAUX = {
+    "national": {"tolerance": 1500, "precision": 1e-3},
+    "regional": {"tolerance": 300, "precision": 1e-4},
+    "local": {"tolerance": 60, "precision": 1e-5},
+    "detail": {"tolerance": 10, "precision": 1e-5},
+}
+
+
+def niveau_pour_zoom(z):
+    """Niveau à utiliser pour un zoom Leaflet donné."""
+    if z <= 6:
+        return "national"
+    if z <= 8:
+        return "regional"
+    if z <= 10:
+        return "local"
+    return "detail"
+
+
+def _simplifier_couverture(geometries, tolerance):
+    import shapely
+    try:
+        return shapely.coverage_simplify(geometries, tolerance)
+    except (AttributeError, shapely.errors.GEOSException) as e:
+        # GEOS < 3.12 ou couverture invalide : simplification polygone par polygone (frontières non partagées)
+        logging.warning('coverage_simplify indisponible (%s), simplification non topologique', e)
+        return shapely.simplify(geometries, tolerance, preserve_topology=True)
+
+
+def simplifier(gdf, niveau):
+    """Renvoie une copie de ``gdf`` (WGS84) simplifiée au ``niveau`` demandé, coordonnées arrondies."""
+    import geopandas as gpd
+    import shapely
+    conf = NIVEAUX[niveau]
+    if gdf.empty:
+        return gdf
+    crs_origine = gdf.crs or "EPSG:4326"
+    lambert = gdf.set_crs(crs_origine, allow_override=True).to_crs(2154)
+    simple = _simplifier_couverture(lambert.geometry.values, conf["tolerance"])
+    resultat = gdf.copy()
+    resultat["geometry"] = gpd.GeoSeries(simple, index=gdf.index, crs=2154).to_crs(4326).values
+    resultat = resultat.set_crs(4326, allow_override=True)
+    resultat["geometry"] = shapely.set_precision(resultat.geometry.values, conf["precision"])
+    return resultat
+
+
+def simplifier_par_cle(gdf, cle, niveau):
+    """Simplifie une seule fois chaque géométrie distincte (identifiée par ``cle``), puis la redistribue.
+
+    Utile pour les tables où le polygone d'un EPCI est répété (une ligne par nationalité).
+    """
+    import geopandas as gpd
+    if gdf.empty:
+        return gdf
+    uniques = gdf.drop_duplicates(subset=cle)[[cle, "geometry"]]
+    simples = simplifier(gpd.GeoDataFrame(uniques, geometry="geometry", crs=gdf.crs), niveau)
+    geometries = simples.set_index(cle)["geometry"]
+    resultat = gdf.copy()
+    resultat["geometry"] = gpd.GeoSeries(resultat[cle].map(geometries).values, index=gdf.index, crs=4326)
+    return resultat.set_crs(4326, allow_override=True)
+
+
+def ecrire_niveaux(chemin, niveaux=None, topojson=False):
+    """Écrit ``<base>_<niveau>.geojson`` (et éventuellement ``.topojson``) à côté de ``chemin``."""
+    import geopandas as gpd
+    gdf = gpd.read_file(chemin)
+    base, _ = os.path.splitext(chemin)
+    taille_origine = os.path.getsize(chemin)
+    for niveau in niveaux or NIVEAUX:
+        simple = simplifier(gdf, niveau)
+        sortie = f"{base}_{niveau}.geojson"
+        simple.to_file(sortie, driver="GeoJSON", COORDINATE_PRECISION=6)
+        logging.info('%s : %.1f Ko (%.0f%% de l\'original)', sortie, os.path.getsize(sortie) / 1e3,
+                     100 * os.path.getsize(sortie) / taille_origine)
+        if topojson:
+            try:
+                import topojson as tp
+            except ImportError:
+                logging.warning('Paquet topojson absent : sortie TopoJSON ignorée')
+                topojson = False
+                continue
+            sortie_topo = f"{base}_{niveau}.topojson"
+            with open(sortie_topo, "w", encoding="utf-8") as f:
+                f.write(tp.Topology(simple, prequantize=False, toposimplify=False).to_json())
+            logging.info('%s : %.1f Ko', sortie_topo, os.path.getsize(sortie_topo) / 1e3)
+
+
+def charger_niveau(chemin, niveau):
+    """Charge la version pré-calculée ``<base>_<niveau>.geojson`` si elle est à jour, sinon simplifie en mémoire."""
+    import geopandas as gpd
+    base, _ = os.path.splitext(chemin)
+    pre = f"{base}_{niveau}.geojson"
+    if os.path.exists(pre) and (not os.path.exists(chemin) or os.path.getmtime(pre) >= os.path.getmtime(chemin)):
+        return gpd.read_file(pre)
+    return simplifier(gpd.read_file(chemin), niveau)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Pré-calcul des géométries simplifiées par niveau de zoom")
+    parser.add_argument("chemin", nargs="?", default=os.path.join(os.path.dirname(__file__), "data_etrangers.geojson"))
+    parser.add_argument("--niveaux", nargs="+", choices=list(NIVEAUX), default=None)
+    parser.add_argument("--topojson", action="store_true", help="écrire aussi du TopoJSON (paquet topojson requis)")
+    args = parser.parse_args()
+    ecrire_niveaux(args.chemin, args.niveaux, args.topojson)
@@ -0,0 +1,186 @@
+# tuiles_epci.py
+
+from flask import Blueprint, render_template, request, make_response
+import gzip
+import hashlib
+import json
+import logging
+import math
+from functools import lru_cache
+
+import carte_nationalites_par_epci as carte_mod
+from reponses_http import reponse_gzip
+from simplification import NIVEAUX, niveau_pour_zoom, simplifier
+
+bp = Blueprint('tuiles', __name__, template_folder='templates')
+logging.basicConfig(level=logging.INFO)
+
+_DECIMALES = 5  # ~1 m, largement suffisant à l'écran
+ZOOM_MAX = 14  # maxZoom de la couche côté client (carte_tuiles.html) : aucune tuile servie au-delà
+
+
+# Les caches ci-dessous prennent en premier argument la version du jeu « cartes » : un calcul commencé
+# avant un rechargement ne peut remplir que l'entrée de l'ancienne version, qui n'est plus lue.
+def _version():
+    return carte_mod.jeu_geo.instantane()[0]
+
+
+@lru_cache(maxsize=1)
+def _geometries_epci(version):
+    """Une géométrie par EPCI : la table de géométries mise en cache par carte_nationalites_par_epci."""
+    geo = carte_mod.get_geometries()
+    if not geo.empty and geo.crs is None:
+        geo = geo.set_crs(4326)
+    return geo
+
+
+@lru_cache(maxsize=1)
+def _empreinte_geometries(version):
+    """Empreinte du contenu des géométries, identique d'un worker (et d'un redémarrage) à l'autre.
+
+    Elle figure dans l'URL des tuiles : de nouvelles géométries donnent de nouvelles URL,
+    les anciennes tuiles gardées par les navigateurs ne sont plus demandées.
+    """
+    import shapely
+    geo = _geometries_epci(version)
+    h = hashlib.sha1()
+    for epci, wkb in zip(geo["EPCI"].astype(str), shapely.to_wkb(geo.geometry.values)):
+        h.update(epci.encode("utf-8"))
+        h.update(wkb)
+    return h.hexdigest()[:16]
+
+
+@lru_cache(maxsize=len(NIVEAUX))
+def _geometries_niveau(version, niveau):
+    """Géométries simplifiées au niveau demandé (frontières partagées conservées), avec index spatial."""
+    geo = _geometries_epci(version)
+    if geo.empty:
+        return geo
+    simple = simplifier(geo, niveau)
+    simple.sindex  # construit l'index spatial une fois pour toutes
+    return simple
+
+
+def _bornes_tuile(z, x, y):
+    """Emprise (lon_min, lat_min, lon_max, lat_max) de la tuile z/x/y (schéma XYZ)."""
+    n = 2 ** z
+
+    def lat(t):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * t / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+@lru_cache(maxsize=4096)
+def tuile(version, z, x, y):
+    """GeoJSON compressé (gzip) des EPCI qui intersectent la tuile, géométries du niveau de zoom."""
+    from shapely.geometry import box
+    geo = _geometries_niveau(version, niveau_pour_zoom(z))
+    features = []
+    if not geo.empty:
+        idx = geo.sindex.query(box(*_bornes_tuile(z, x, y)), predicate="intersects")
+        for epci, nom, geom in geo.iloc[idx][["EPCI", "nom_epci", "geometry"]].itertuples(index=False, name=None):
+            features.append({
+                "type": "Feature",
+                "properties": {"EPCI": epci, "nom_epci": nom},
+                "geometry": _arrondir(geom.__geo_interface__),
+            })
+    corps = json.dumps({"type": "FeatureCollection", "features": features}, separators=(",", ":"))
+    return gzip.compress(corps.encode("utf-8"), compresslevel=6)
+
+
+def _arrondir(geom):
+    def r(c):
+        if isinstance(c[0], (int, float)):
+            return [round(v, _DECIMALES) for v in c]
+        return [r(sous) for sous in c]
+    return {"type": geom["type"], "coordinates": r(geom["coordinates"])}
+
+
+# --- Tuiles de géométrie : envoyées une fois, mises en cache par le navigateur ---
+@bp.route("/tiles/<int:z>/<int:x>/<int:y>")
+def tiles(z, x, y):
+    # zoom borné : chaque z/x/y distinct occuperait une entrée du cache de tuiles
+    if not 0 <= z <= ZOOM_MAX or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return make_response(json.dumps({"error": "Tuile hors limites"}), 404, {"Content-Type": "application/json"})
+    version = _version()
+    # cache long seulement si l'URL porte l'empreinte des géométries servies ; sinon revalidation par ETag
+    max_age = 86400 if request.args.get("v") == _empreinte_geometries(version) else None
+    return reponse_gzip(tuile(version, z, x, y), max_age=max_age)
+
+
+@lru_cache(maxsize=256)
+def _valeurs_nationalite(version, nat):
+    attributs = carte_mod.get_attributs()
+    sel = attributs[attributs["Nationalite"] == nat] if not attributs.empty else attributs
+    if sel.empty:
+        return None
+    parts = carte_mod.en_float64(sel["part_etrg_epci"])
+    totaux = carte_mod.en_float64(sel["total_s"])
+    valeurs = {
+        str(epci): {"valeur": part, "total_s": total}
+        for epci, part, total in zip(sel["EPCI"], parts, totaux)
+    }
+    corps = {"valeurs": valeurs, "min": float(parts.min()), "max": float(parts.max()), "libelle": f"Part de {nat} (%)"}
+    return gzip.compress(json.dumps(corps, separators=(",", ":")).encode("utf-8"))
+
+
+# --- Données par sélection : seulement les valeurs, jamais la géométrie ---
+@bp.route("/valeurs")
+def valeurs():
+    nat = request.args.get("Nationalite", "")
+    corps = _valeurs_nationalite(_version(), nat)
+    if corps is None:
+        return make_response(
+            json.dumps({"error": "Pas de données pour cette nationalité"}),
+            200,
+            {"Content-Type": "application/json"}
+        )
+    # URL sans version : revalidation par ETag, les valeurs suivent les rechargements
+    return reponse_gzip(corps)
+
+
+@lru_cache(maxsize=1)
+def _valeurs_etrangers(version):
+    """``version`` du jeu de données : une nouvelle version remplace l'unique entrée du cache."""
+    import mon_graphique as mon_mod
+    data = mon_mod.get_data()
+    if data is None or "EPCI" not in data.columns:
+        return None
+    pct = data["Pct_Etranger"].astype(float)
+    valeurs = {str(epci): {"valeur": v} for epci, v in zip(data["EPCI"], pct) if v == v}
+    corps = {"valeurs": valeurs, "min": float(pct.min()), "max": float(pct.max()), "libelle": "% Étrangers"}
+    return gzip.compress(json.dumps(corps, separators=(",", ":")).encode("utf-8"))
+
+
+@bp.route("/valeurs_etrangers")
+def valeurs_etrangers():
+    import mon_graphique as mon_mod
+    mon_mod.get_data()
+    corps = _valeurs_etrangers(mon_mod.jeu_etrangers.version)
+    if corps is None:
+        return make_response(json.dumps({"error": "Pas de données"}), 200, {"Content-Type": "application/json"})
+    return reponse_gzip(corps)
+
+
+@carte_mod.jeu_geo.abonner
+def _vider_caches_geometrie():
+    """Nouvelle version des données EPCI : libère la mémoire des versions précédentes."""
+    for cache in (_geometries_epci, _empreinte_geometries, _geometries_niveau, tuile, _valeurs_nationalite):
+        cache.cache_clear()
+
+
+@bp.route("/carte")
+def index():
+    attributs = carte_mod.get_attributs()
+    Nationalite = sorted(attributs["Nationalite"].unique()) if not attributs.empty else []
+    return render_template("carte_tuiles.html", Nationalite=Nationalite, empreinte=_empreinte_geometries(_version()),
+                           zoom_max=ZOOM_MAX)
+
+
+if __name__ == "__main__":
+    # Run standalone for debugging
+    from flask import Flask
+    app = Flask(__name__)
+    app.register_blueprint(bp, url_prefix='/epci')
+    app.run(debug=True)
@@ -0,0 +1,62 @@
+# wsgi.py
+"""Point d'entrée WSGI de production.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Les jeux de données sont chargés, et les cartes / histogrammes pré-rendus, dans
+le processus maître avant le fork des workers (``preload_app``) : les workers
+partagent ces pages mémoire en copie à l'écriture au lieu de recharger chacun
+les données. ``INSEE_PRECHARGEMENT=0`` désactive ce préchargement.
+"""
+import gc
+import importlib
+import logging
+import os
+import time
+
+os.environ.setdefault("INSEE_PRODUCTION", "1")
+
+from app import create_app
+from gestion_donnees import gestionnaire
+
+logging.basicConfig(level=logging.INFO)
+
+# bibliothèques importées au premier usage par les blueprints : importées ici avant le fork,
+# pour que les workers n'en paient pas le coût à leur première requête
+BIBLIOTHEQUES = ("pandas", "geopandas", "folium", "branca", "bokeh.plotting", "bokeh.embed")
+
+
+def precharger():
+    debut = time.perf_counter()
+    for nom in BIBLIOTHEQUES:
+        try:
+            importlib.import_module(nom)
+        except ImportError as e:
+            logging.warning('Could not import %s: %s', nom, e)
+    gestionnaire.prechauffer()
+    try:
+        import carte_nationalites_par_epci as carte_mod
+        if os.environ.get("CARTES_PRECHAUFFAGE", "1") != "0":
+            carte_mod.cache_cartes.prechauffer()
+    except Exception as e:
+        logging.warning('Could not warm map cache: %s', e)
+    try:
+        import histogrammes as hist_mod
+        if hist_mod.PRECALCUL:
+            hist_mod.precalculer()
+    except Exception as e:
+        logging.warning('Could not precompute histograms: %s', e)
+    try:
+        import mon_graphique as mon_mod
+        mon_mod.get_index_regions()
+    except Exception as e:
+        logging.warning('Could not build region index: %s', e)
+    # objets préchargés sortis du suivi du ramasse-miettes : ses passages ne touchent plus
+    # leurs pages mémoire, qui restent partagées entre workers
+    gc.freeze()
+    logging.info('Préchargement terminé en %.1f s', time.perf_counter() - debut)
+
+
+app = create_app(production=True)
+if os.environ.get("INSEE_PRECHARGEMENT", "1") != "0":
+    precharger()
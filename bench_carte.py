@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Mesure le temps de construction et le poids de la carte des usines selon le mode de rendu.
+
+    python bench_carte.py [--tailles 1000 10000 100000] [--modes cluster canvas marqueurs]
+
+Le mode ``marqueurs`` (un folium.Marker par ligne) n'est mesuré que jusqu'à
+``--max-marqueurs`` points.
+"""
+import argparse
+import time
+
+from bench_formats import frame_synthetique
+from carte_usines import MODES, creer_carte
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tailles", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--max-marqueurs", type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(f"{'points':>8} {'mode':>10} {'construction (s)':>17} {'page (Mo)':>10}")
+    for n in args.tailles:
+        df = frame_synthetique(n)
+        for mode in args.modes:
+            if mode == "marqueurs" and n > args.max_marqueurs:
+                continue
+            debut = time.perf_counter()
+            html = creer_carte(df, mode=mode).get_root().render()
+            duree = time.perf_counter() - debut
+            print(f"{n:>8} {mode:>10} {duree:>17.2f} {len(html.encode()) / 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Compare les temps de chargement du résultat de géocodage selon le format.
+
+    python bench_formats.py [--tailles 10000 100000 1000000] [--max-excel 100000]
+
+Les fichiers synthétiques (mêmes colonnes que Geocodage_corrige) sont écrits
+dans un dossier temporaire ; l'Excel n'est mesuré que jusqu'à ``--max-excel``
+lignes, son écriture devenant très longue au-delà.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def frame_synthetique(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "code_usine": np.arange(n),
+        "Adresse  ": pd.Series(rng.integers(1, 200, n)).astype(str) + " rue de la Gare",
+        "Code postal INSEE": pd.Series(rng.integers(86001, 86300, n)).astype(str),
+        "Nom_de_la_commune": rng.choice(["Poitiers", "Châtellerault", "Loudun", "Montmorillon"], n),
+        "Code_postal": rng.choice([86000, 86100, 86200, 86500], n),
+        "latitude": rng.uniform(46.0, 47.6, n),
+        "longitude": rng.uniform(-0.5, 1.5, n),
+    })
+
+
+def chrono(fonction, repetitions=3):
+    meilleur = float("inf")
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        meilleur = min(meilleur, time.perf_counter() - debut)
+    return meilleur
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tailles", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--max-excel", type=int, default=100_000)
+    args = parser.parse_args()
+
+    import pyarrow.feather as feather
+
+    print(f"{'lignes':>10} {'format':>8} {'taille (Mo)':>12} {'chargement (s)':>15}")
+    with tempfile.TemporaryDirectory() as dossier:
+        for n in args.tailles:
+            df = frame_synthetique(n)
+            chemins = {
+                "feather": os.path.join(dossier, f"{n}.feather"),
+                "parquet": os.path.join(dossier, f"{n}.parquet"),
+                "xlsx": os.path.join(dossier, f"{n}.xlsx"),
+            }
+            df.to_feather(chemins["feather"], compression="uncompressed")
+            df.to_parquet(chemins["parquet"], index=False)
+            lecteurs = {
+                "feather": lambda: feather.read_table(chemins["feather"], memory_map=True).to_pandas(),
+                "parquet": lambda: pd.read_parquet(chemins["parquet"], memory_map=True),
+            }
+            if n <= args.max_excel:
+                df.to_excel(chemins["xlsx"], index=False)
+                lecteurs["xlsx"] = lambda: pd.read_excel(chemins["xlsx"])
+            for fmt, lire in lecteurs.items():
+                duree = chrono(lire, repetitions=1 if fmt == "xlsx" else 3)
+                taille = os.path.getsize(chemins[fmt]) / 1e6
+                print(f"{n:>10} {fmt:>8} {taille:>12.1f} {duree:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Cache de géocodage persistant (SQLite).
+
+Chaque résultat est écrit dès qu'il arrive : un arrêt brutal ne perd que la
+requête en cours. La base s'ouvre en temps constant quelle que soit sa taille
+(pas de relecture complète comme avec ``geocache.csv``) et peut être partagée
+par les workers du moteur de géocodage (une connexion par thread, mode WAL).
+Les échecs sont aussi mémorisés, avec une durée de validité, pour ne pas
+retenter à chaque exécution les adresses connues comme introuvables.
+
+L'objet se manipule comme un dict adresse -> (lat, lon) ; une adresse en
+échec récent est « dans » le cache et vaut None.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+# Durée de validité d'un échec avant nouvelle tentative (30 jours)
+TTL_ECHEC = 30 * 24 * 3600
+
+
+class GeocacheSQLite:
+    """Cache adresse -> (lat, lon) stocké dans une base SQLite."""
+
+    def __init__(self, chemin="geocache.sqlite", ttl_echec=TTL_ECHEC, csv_import="geocache.csv"):
+        self.chemin = chemin
+        self.ttl_echec = ttl_echec
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS geocache (
+                adresse TEXT PRIMARY KEY,
+                latitude REAL,
+                longitude REAL,
+                horodatage REAL NOT NULL
+            )"""
+        )
+        # Reprise de l'ancien cache CSV, une seule fois
+        if csv_import and os.path.exists(csv_import) and self.est_vide():
+            self.importer_csv(csv_import)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.chemin, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _ligne(self, adresse):
+        ligne = self._conn().execute(
+            "SELECT latitude, longitude, horodatage FROM geocache WHERE adresse = ?", (adresse,)
+        ).fetchone()
+        if ligne is None:
+            return None
+        lat, lon, horodatage = ligne
+        if lat is None and time.time() - horodatage > self.ttl_echec:
+            # échec expiré : l'adresse sera retentée
+            return None
+        return ligne
+
+    def __contains__(self, adresse):
+        return self._ligne(adresse) is not None
+
+    def __getitem__(self, adresse):
+        ligne = self._ligne(adresse)
+        if ligne is None:
+            raise KeyError(adresse)
+        lat, lon, _ = ligne
+        return None if lat is None else (lat, lon)
+
+    def get(self, adresse, default=None):
+        try:
+            return self[adresse]
+        except KeyError:
+            return default
+
+    def __setitem__(self, adresse, coords):
+        lat, lon = coords if coords is not None else (None, None)
+        self._conn().execute(
+            "INSERT OR REPLACE INTO geocache VALUES (?, ?, ?, ?)",
+            (adresse, lat, lon, time.time()),
+        )
+
+    def marquer_echec(self, adresse):
+        """Mémorise un échec de géocodage (retenté après ``ttl_echec`` secondes)."""
+        self[adresse] = None
+
+    def est_vide(self):
+        return self._conn().execute("SELECT 1 FROM geocache LIMIT 1").fetchone() is None
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM geocache").fetchone()[0]
+
+    def importer_csv(self, chemin):
+        import pandas as pd
+        cache_df = pd.read_csv(chemin).dropna(subset=["latitude", "longitude"])
+        maintenant = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT OR IGNORE INTO geocache VALUES (?, ?, ?, ?)",
+            ((a, float(la), float(lo), maintenant)
+             for a, la, lo in zip(cache_df["adresse"], cache_df["latitude"], cache_df["longitude"])),
+        )
+        conn.execute("COMMIT")
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
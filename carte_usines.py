@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Carte folium des usines géocodées, utilisable à grande échelle.
+
+Les points sont extraits en bloc des colonnes latitude/longitude (pas de
+``folium.Marker`` par ligne) et envoyés au navigateur en une seule charge utile :
+
+- ``cluster`` : tableau compact [lat, lon, popup] rendu par Leaflet.markercluster
+  (FastMarkerCluster), les marqueurs n'étant créés que côté client ;
+- ``canvas`` : une FeatureCollection GeoJSON dessinée en cercles sur un canvas
+  (``prefer_canvas``), sans un élément DOM par point ;
+- ``marqueurs`` : l'ancien rendu, un marqueur par ligne (petits fichiers seulement).
+"""
+import folium
+import pandas as pd
+from folium.plugins import FastMarkerCluster
+
+MODES = ("cluster", "canvas", "marqueurs")
+
+_CALLBACK_CLUSTER = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.bindPopup(row[2]);
+    return marker;
+}
+"""
+
+
+def points(df, col_adresse="Adresse  ", col_code="code_usine"):
+    """DataFrame (latitude, longitude, popup) des lignes géocodées, construit sans boucle Python."""
+    pts = df[["latitude", "longitude"]].apply(pd.to_numeric, errors="coerce")
+    pts["popup"] = df[col_code].astype(str) + " - " + df[col_adresse].astype(str)
+    return pts.dropna(subset=["latitude", "longitude"])
+
+
+def creer_carte(df, mode="cluster", col_adresse="Adresse  ", col_code="code_usine"):
+    """Construit la carte des usines de ``df`` dans le mode choisi (voir MODES)."""
+    pts = points(df, col_adresse, col_code)
+    m = folium.Map(location=[pts["latitude"].mean(), pts["longitude"].mean()], zoom_start=6,
+                   prefer_canvas=(mode == "canvas"))
+
+    if mode == "cluster":
+        FastMarkerCluster(pts.to_numpy().tolist(), callback=_CALLBACK_CLUSTER).add_to(m)
+    elif mode == "canvas":
+        geojson = {
+            "type": "FeatureCollection",
+            "features": [
+                {"type": "Feature", "properties": {"popup": popup},
+                 "geometry": {"type": "Point", "coordinates": [lon, lat]}}
+                for lat, lon, popup in pts.itertuples(index=False, name=None)
+            ],
+        }
+        folium.GeoJson(
+            geojson,
+            marker=folium.CircleMarker(radius=4, weight=1, fill=True, fill_opacity=0.7),
+            popup=folium.GeoJsonPopup(fields=["popup"], labels=False),
+        ).add_to(m)
+    elif mode == "marqueurs":
+        for lat, lon, popup in pts.itertuples(index=False, name=None):
+            folium.Marker(location=[lat, lon], popup=popup).add_to(m)
+    else:
+        raise ValueError(f"mode inconnu : {mode} (attendu : {', '.join(MODES)})")
+    return m
@@ -1,165 +1,235 @@
 from geopy.geocoders import Nominatim
 import pandas as pd
-import time
+import argparse
+import glob
 import os
-import folium
+import time
+
+from cache_geocodage import GeocacheSQLite
+from carte_usines import MODES, creer_carte
+from moteur_geocodage import MoteurGeocodage, BACKENDS
+from validation_zone import Zone, variantes_adresse, corriger_hors_zone
 
 # Test une adresse (fonction existante)
 def test_une_adresse(adress="175 5th Avenue NYC"):
     geolocator = Nominatim(user_agent="test_christine")
     location = geolocator.geocode(adress)
-    if location is not None:        
+    if location is not None:
         print((location.latitude, location.longitude))
         return location.raw
     else:
         return None
 
-# Ouverture des fichiers
-with open(r"Usine complet_anonyme.xlsx", 'rb') as f:
-    df = pd.read_excel(f, sheet_name='Feuil1')
-
-print(df.shape)  
-print(df.columns)
-
-with open(r"019HexaSmal.csv", encoding="latin1") as f:
-    laposte = pd.read_csv(f, sep=';')
-
-print(laposte.shape)
-print(laposte.columns)
-
-# la jointure après harmonisation des données
-df['Code postal INSEE'] = df['Code postal INSEE'].astype(str).str.strip()
-laposte['#Code_commune_INSEE'] = laposte['#Code_commune_INSEE'].astype(str).str.strip()
-laposte_unique = laposte[['#Code_commune_INSEE', 'Code_postal']].drop_duplicates(subset=['#Code_commune_INSEE'])
-
-df_merged = df.merge(
-    laposte_unique,
-    how='left',
-    left_on='Code postal INSEE',
-    right_on='#Code_commune_INSEE'
-)
-
-# nouveau fichier avec les codes postaux, mais sans la colonne de jointure qui fait doublon
-if '#Code_commune_INSEE' in df_merged.columns:
-    df_merged.drop(columns=['#Code_commune_INSEE'], inplace=True)
-
-df_merged.to_excel("Usine_complet_anonyme_avec_Code_postal.xlsx", index=False)
-
-#géocodage final après test 
-print(df_merged.columns)
-
-if 'latitude' not in df_merged.columns:
-    df_merged['latitude'] = None
-if 'longitude' not in df_merged.columns:
-    df_merged['longitude'] = None
-
-# Chargement du cache
-cache_file = "geocache.csv"
-if os.path.exists(cache_file):
-    cache_df = pd.read_csv(cache_file)
-    geocache = dict(zip(cache_df['adresse'], zip(cache_df['latitude'], cache_df['longitude'])))
-else:
-    geocache = {}
-
-# géocodeur
-geolocator = Nominatim(user_agent="geo_christine")
-def geocode_with_retry(address, retries=3):
-    for _ in range(retries):
-        try:
-            return geolocator.geocode(address, timeout=10)
-        except:
-            time.sleep(2)
-    return None
-
-for i, row in df_merged.iterrows():
-    if pd.notna(row['latitude']) and pd.notna(row['longitude']):
-        continue
-
-    adresse = f"{row['Adresse  ']} {row['Code_postal']}, France"
-    if adresse in geocache:
-        lat, lon = geocache[adresse]
-        df_merged.at[i, 'latitude'] = lat
-        df_merged.at[i, 'longitude'] = lon
-        print(f"Ligne {i} - trouvé en cache")
-    else:
-        location = geocode_with_retry(adresse)
-        if location:
-            df_merged.at[i, 'latitude'] = location.latitude
-            df_merged.at[i, 'longitude'] = location.longitude
-            geocache[adresse] = (location.latitude, location.longitude)
-            print(f"Ligne {i} - géocodé: {location.latitude}, {location.longitude}")
-        else:
-            df_merged.at[i, 'latitude'] = None
-            df_merged.at[i, 'longitude'] = None
-            print(f"Ligne {i} - géocodage échoué")
-
-        time.sleep(1)
-
-# Sauvegarde du fichier final
-df_merged.to_excel("Usine_geocode_final.xlsx", index=False)
-# Sauvegarde du cache pour les relances éventuelles
-cache_df = pd.DataFrame([
-    {'adresse': k, 'latitude': v[0], 'longitude': v[1]}
-    for k, v in geocache.items()
-])
-cache_df.to_csv(cache_file, index=False)
-
-##seulement 5 échecs au premier essai complet, liés à des coquilles. J'ai corrigé le fichier original de df à la main vue la brièveté du correctif.
-
-# Correction des points hors de la Vienne après 1er essai de cartographie
-def est_dans_vienne(lat, lon):
-    if pd.isna(lat) or pd.isna(lon):
-        return False
-    # coordonnées du 86
-    return 46.0 <= lat <= 47.6 and -0.5 <= lon <= 1.5
-
-for i, row in df_merged.iterrows():
-    if pd.notna(row['latitude']) and pd.notna(row['longitude']) and est_dans_vienne(row['latitude'], row['longitude']):
-        continue
-    commune = row.get('Nom_de_la_commune', '').strip()
-    code_postal = str(row['Code_postal']).strip()
-    adresse_simple = f"{row['Adresse  '].strip()} {code_postal}, France"
-    adresse_commune = f"{row['Adresse  '].strip()} {code_postal} {commune}, France" if commune else adresse_simple
-    adresse_code_commune = f"{code_postal} {commune}, France" if commune else f"{code_postal}, France"
-    adresses_tester = [adresse_commune, adresse_simple, adresse_code_commune]
-    location = None
-    for adresse in adresses_tester:
-        if adresse in geocache:
-            lat, lon = geocache[adresse]
-            if est_dans_vienne(lat, lon):
-                location = type('Loc', (), {'latitude': lat, 'longitude': lon})
-                print(f"Ligne {i} - trouvé en cache avec adresse: {adresse}")
-                break
-        else:
-            loc = geocode_with_retry(adresse)
-            if loc and est_dans_vienne(loc.latitude, loc.longitude):
-                location = loc
-                geocache[adresse] = (loc.latitude, loc.longitude)
-                print(f"Ligne {i} - géocodé avec adresse: {adresse}")
-                break
-            else:
-                print(f"Ligne {i} - adresse {adresse} hors Vienne ou non trouvée")
-
-        time.sleep(1) 
-        
-    if location:
-        df_merged.at[i, 'latitude'] = location.latitude
-        df_merged.at[i, 'longitude'] = location.longitude
+
+def lire_entree(chemin, feuille):
+    # Ouverture des fichiers
+    if chemin.endswith(".csv"):
+        return pd.read_csv(chemin)
+    with open(chemin, 'rb') as f:
+        return pd.read_excel(f, sheet_name=feuille)
+
+
+def _pour_arrow(df):
+    # les colonnes Excel de types mélangés (nombres et textes) sont refusées par Arrow : on les passe en texte
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        textes = df[col].dropna().map(lambda v: isinstance(v, str))
+        if textes.any() and not textes.all():
+            df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+    return df
+
+
+def ecrire_sortie(df, chemin):
+    if chemin.endswith((".feather", ".parquet")):
+        df = _pour_arrow(df)
+    # Feather non compressé : relu par projection mémoire (memory_map) côté serveur de carte
+    if chemin.endswith(".feather"):
+        df.reset_index(drop=True).to_feather(chemin, compression="uncompressed")
+    elif chemin.endswith(".parquet"):
+        df.to_parquet(chemin, index=False)
+    elif chemin.endswith(".csv"):
+        df.to_csv(chemin, index=False)
     else:
-        df_merged.at[i, 'latitude'] = None
-        df_merged.at[i, 'longitude'] = None
-        print(f"Ligne {i} - géocodage échoué ou hors zone")
-
-df_merged.to_excel("Geocodage_corrige.xlsx", index=False)
-
-#création d'une carte avec folium
-center_lat = df_merged['latitude'].mean()
-center_lon = df_merged['longitude'].mean()
-m = folium.Map(location=[center_lat, center_lon], zoom_start=6)
-for _, row in df_merged.iterrows():
-    if pd.notna(row['latitude']) and pd.notna(row['longitude']):
-        folium.Marker(
-            location=[row['latitude'], row['longitude']],
-            popup=f"{row['code_usine']} - {row['Adresse  ']}",
-        ).add_to(m)
-m.save("Carte_geocodage.html")
\ No newline at end of file
+        df.to_excel(chemin, index=False)
+
+
+def joindre_codes_postaux(df, laposte_csv, col_insee):
+    with open(laposte_csv, encoding="latin1") as f:
+        laposte = pd.read_csv(f, sep=';')
+
+    print(laposte.shape)
+    print(laposte.columns)
+
+    # la jointure après harmonisation des données
+    df[col_insee] = df[col_insee].astype(str).str.strip()
+    laposte['#Code_commune_INSEE'] = laposte['#Code_commune_INSEE'].astype(str).str.strip()
+    laposte_unique = laposte[['#Code_commune_INSEE', 'Code_postal']].drop_duplicates(subset=['#Code_commune_INSEE'])
+
+    df_merged = df.merge(
+        laposte_unique,
+        how='left',
+        left_on=col_insee,
+        right_on='#Code_commune_INSEE'
+    )
+
+    # sans la colonne de jointure qui fait doublon
+    if '#Code_commune_INSEE' in df_merged.columns:
+        df_merged.drop(columns=['#Code_commune_INSEE'], inplace=True)
+    return df_merged
+
+
+def geocoder_lot(lot, args, moteur, hors_ligne, zone):
+    """Géocode un lot de lignes : index hors ligne, réseau pour le reliquat, puis correction hors zone."""
+    # valeurs manquantes (code postal absent de la table La Poste...) remplacées par du texte vide :
+    # sous pandas 3, astype(str) les laisse NaN et toute la clé d'adresse deviendrait NaN
+    adresse = lot[args.col_adresse].fillna("").astype(str).str.strip()
+    code_postal = lot[args.col_cp].fillna("").astype(str).str.strip()
+    adresses = (adresse + ' ' + code_postal).str.strip() + ', France'
+    if hors_ligne is not None:
+        n = hors_ligne.geocode_frame(lot, adresses, niveaux=("adresse", "voie"))
+        print(f"  {n} lignes résolues hors ligne")
+
+    # adresses dédoublonnées puis géocodées en parallèle derrière le limiteur de débit
+    stats = moteur.geocode_frame(lot, adresses)
+    print(f"  {stats['lignes']} lignes, {stats['adresses_uniques']} adresses uniques "
+          f"({stats['depuis_cache']} en cache), {stats['echecs']} échecs - {stats['lignes_par_s']:.1f} lignes/s")
+
+    # Correction des points hors zone : validation vectorisée puis cascade de variantes en lots
+    stats = corriger_hors_zone(lot, moteur, zone, variantes_adresse(lot, args.col_adresse, args.col_cp, args.col_commune))
+    print(f"  {stats['hors_zone']} lignes hors du {args.departement}, corrigées par variante : {stats['corrigees']}, "
+          f"{stats['echecs']} échecs ou hors zone")
+    return lot
+
+
+def charger_etat(dossier):
+    """Résultats des lots déjà terminés : DataFrame (empreinte, latitude, longitude).
+
+    Seules les lignes géocodées comptent comme faites : une ligne sans coordonnées
+    (introuvable, panne réseau, hors zone) est retentée à la reprise suivante.
+    """
+    fichiers = sorted(glob.glob(os.path.join(dossier, "*.parquet")))
+    if not fichiers:
+        return pd.DataFrame({"empreinte": pd.Series(dtype="uint64"),
+                             "latitude": pd.Series(dtype=float), "longitude": pd.Series(dtype=float)})
+    etat = pd.concat([pd.read_parquet(f) for f in fichiers], ignore_index=True)
+    # points de reprise écrits avant que les lignes sans coordonnées n'en soient exclues
+    etat = etat.dropna(subset=["latitude", "longitude"])
+    return etat.drop_duplicates(subset="empreinte", keep="last")
+
+
+def compacter_etat(dossier, etat):
+    """Regroupe les fichiers de lots en un seul etat.parquet une fois le traitement terminé."""
+    tmp = os.path.join(dossier, "etat.parquet.tmp")
+    etat.to_parquet(tmp, index=False)
+    os.replace(tmp, os.path.join(dossier, "etat.parquet"))
+    for f in glob.glob(os.path.join(dossier, "lot_*.parquet")):
+        os.remove(f)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Géocodage par lots des usines, avec reprise sur incident.")
+    parser.add_argument("entree", nargs="?", default="Usine complet_anonyme.xlsx", help="fichier d'entrée (xlsx ou csv)")
+    parser.add_argument("--feuille", default="Feuil1", help="feuille Excel à lire")
+    parser.add_argument("--col-adresse", default="Adresse  ")
+    parser.add_argument("--col-cp", default="Code_postal", help="colonne code postal (ajoutée par la jointure La Poste)")
+    parser.add_argument("--col-commune", default="Nom_de_la_commune")
+    parser.add_argument("--col-insee", default="Code postal INSEE", help="colonne de jointure avec la table La Poste")
+    parser.add_argument("--laposte", default="019HexaSmal.csv")
+    parser.add_argument("--sortie", default="Geocodage_corrige.feather",
+                        help="fichier de sortie (.feather, .parquet, .csv ou .xlsx)")
+    parser.add_argument("--excel", default=None, help="export Excel supplémentaire en fin de traitement (ex. Geocodage_corrige.xlsx)")
+    parser.add_argument("--intermediaire", default="Usine_complet_anonyme_avec_Code_postal.parquet",
+                        help="fichier intermédiaire après jointure La Poste ('' pour ne pas l'écrire)")
+    parser.add_argument("--carte", default="Carte_geocodage.html", help="carte folium ('' pour ne pas la produire)")
+    parser.add_argument("--mode-carte", default="cluster", choices=MODES, help="rendu des points (cf. carte_usines.py)")
+    parser.add_argument("--backend", default="nominatim", choices=sorted(BACKENDS))
+    parser.add_argument("--workers", type=int, default=None, help="nombre de workers (défaut : celui du backend)")
+    parser.add_argument("--cache", default="geocache.sqlite")
+    parser.add_argument("--index-ban", default="ban_index.parquet", help="index hors ligne (cf. geocodeur_hors_ligne.py)")
+    parser.add_argument("--extrait-ban", default="adresses-86.csv", help="extrait BAN pour construire l'index s'il manque")
+    parser.add_argument("--departement", default="86")
+    parser.add_argument("--contours", default=None, help="géométries des départements pour la validation point-dans-polygone")
+    parser.add_argument("--emprise", type=float, nargs=4, default=None, metavar=("LAT_MIN", "LAT_MAX", "LON_MIN", "LON_MAX"),
+                        help="emprise du département, requise hors Vienne (86) si --contours n'est pas fourni")
+    parser.add_argument("--taille-lot", type=int, default=1000, help="nombre de lignes par point de reprise")
+    parser.add_argument("--reprise-dossier", default="geocodage_reprise")
+    parser.add_argument("--reprise", action=argparse.BooleanOptionalAction, default=True,
+                        help="reprendre depuis le dernier lot terminé et ignorer les lignes inchangées")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    df = lire_entree(args.entree, args.feuille)
+    print(df.shape)
+    print(df.columns)
+
+    df_merged = joindre_codes_postaux(df, args.laposte, args.col_insee)
+    if args.intermediaire:
+        ecrire_sortie(df_merged, args.intermediaire)
+
+    if 'latitude' not in df_merged.columns:
+        df_merged['latitude'] = None
+    if 'longitude' not in df_merged.columns:
+        df_merged['longitude'] = None
+
+    # Empreinte des colonnes d'adresse : une ligne inchangée depuis la dernière livraison n'est pas regéocodée
+    colonnes = [c for c in (args.col_adresse, args.col_cp, args.col_commune, args.col_insee) if c in df_merged.columns]
+    df_merged['empreinte'] = pd.util.hash_pandas_object(df_merged[colonnes].astype(str), index=False).to_numpy()
+
+    os.makedirs(args.reprise_dossier, exist_ok=True)
+    if not args.reprise:
+        for f in glob.glob(os.path.join(args.reprise_dossier, "*.parquet")):
+            os.remove(f)
+    etat = charger_etat(args.reprise_dossier)
+    deja_faites = df_merged['empreinte'].isin(etat['empreinte'])
+    print(f"{int(deja_faites.sum())} lignes inchangées reprises de {args.reprise_dossier}, "
+          f"{int((~deja_faites).sum())} à géocoder")
+
+    # Chargement du cache (SQLite, écrit au fil de l'eau ; l'ancien geocache.csv est repris au premier lancement)
+    geocache = GeocacheSQLite(args.cache, csv_import="geocache.csv")
+    moteur = MoteurGeocodage.depuis_backend(args.backend, workers=args.workers, cache=geocache)
+    zone = Zone.departement(args.departement, contours=args.contours, emprise=args.emprise)
+
+    # mode hors ligne : résolution en mémoire sur l'index BAN / La Poste, seul le reliquat part sur le réseau
+    hors_ligne = None
+    if not os.path.exists(args.index_ban) and os.path.exists(args.extrait_ban):
+        from geocodeur_hors_ligne import construire_index
+        construire_index(args.index_ban, ban_csv=args.extrait_ban, laposte_csv=args.laposte)
+    if os.path.exists(args.index_ban):
+        from geocodeur_hors_ligne import GeocodeurHorsLigne
+        hors_ligne = GeocodeurHorsLigne(args.index_ban)
+
+    a_faire = df_merged.loc[~deja_faites]
+    nb_lots = (len(a_faire) + args.taille_lot - 1) // args.taille_lot
+    debut = time.perf_counter()
+    for n, start in enumerate(range(0, len(a_faire), args.taille_lot)):
+        print(f"Lot {n + 1}/{nb_lots}")
+        lot = geocoder_lot(a_faire.iloc[start:start + args.taille_lot].copy(), args, moteur, hors_ligne, zone)
+        # point de reprise : écrit atomiquement une fois le lot terminé, lignes géocodées seulement
+        resultat = lot[['empreinte', 'latitude', 'longitude']].astype({'latitude': float, 'longitude': float})
+        resultat = resultat.dropna(subset=['latitude', 'longitude'])
+        chemin = os.path.join(args.reprise_dossier, f"lot_{time.time_ns()}.parquet")
+        resultat.to_parquet(chemin + ".tmp", index=False)
+        os.replace(chemin + ".tmp", chemin)
+    if len(a_faire):
+        duree = time.perf_counter() - debut
+        print(f"{len(a_faire)} lignes géocodées en {duree:.1f} s ({len(a_faire) / duree:.1f} lignes/s)")
+
+    etat = charger_etat(args.reprise_dossier)
+    compacter_etat(args.reprise_dossier, etat)
+    coords = etat.set_index('empreinte')
+    df_merged['latitude'] = df_merged['empreinte'].map(coords['latitude'])
+    df_merged['longitude'] = df_merged['empreinte'].map(coords['longitude'])
+
+    df_merged = df_merged.drop(columns=['empreinte'])
+    ecrire_sortie(df_merged, args.sortie)
+    if args.excel:
+        ecrire_sortie(df_merged, args.excel)
+    if args.carte:
+        creer_carte(df_merged, mode=args.mode_carte, col_adresse=args.col_adresse).save(args.carte)
+
+
+if __name__ == "__main__":
+    main()
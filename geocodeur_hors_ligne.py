@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""Géocodage hors ligne à partir d'un extrait BAN / La Poste fourni localement.
+
+``construire_index`` produit un index compact (Parquet) à trois niveaux :
+
+- adresse : numéro + voie normalisée + code postal -> lat/lon du point BAN ;
+- voie : voie normalisée + code postal -> centroïde des numéros de la voie ;
+- commune : code postal -> centroïde (BAN, ou ``coordonnees_gps`` de La Poste).
+
+``GeocodeurHorsLigne.resoudre`` résout une série d'adresses en bloc par
+jointures en mémoire ; seul le reliquat non trouvé part ensuite sur le réseau.
+L'objet expose aussi ``geocode(address)`` pour s'utiliser comme un géocodeur
+geopy dans ``moteur_geocodage``.
+"""
+import os
+import re
+import unicodedata
+
+import pandas as pd
+
+NIVEAUX = ("adresse", "voie", "commune")
+
+# Abréviations courantes dans les fichiers saisis à la main
+ABREVIATIONS = {
+    "AV": "AVENUE", "AVE": "AVENUE", "BD": "BOULEVARD", "BLD": "BOULEVARD",
+    "CHE": "CHEMIN", "CHEM": "CHEMIN", "RTE": "ROUTE", "PL": "PLACE",
+    "IMP": "IMPASSE", "ALL": "ALLEE", "R": "RUE", "FG": "FAUBOURG",
+    "ST": "SAINT", "STE": "SAINTE", "ZI": "ZONE INDUSTRIELLE", "ZA": "ZONE ARTISANALE",
+}
+_MOTS = re.compile(r"\b(" + "|".join(ABREVIATIONS) + r")\b")
+_ADRESSE = re.compile(r"^\s*(?P<voie>.*?)[\s,]*(?P<cp>\d{5})\b")
+_NUMERO = re.compile(r"^(?P<num>\d+)\s*(?P<rep>BIS|TER|QUATER|[A-Z](?=\s))?\s*(?P<nom>.*)$")
+
+
+def normaliser(serie):
+    """Normalise une série de libellés : majuscules sans accents ni ponctuation, abréviations développées."""
+    s = serie.fillna("").astype(str).str.normalize("NFKD")
+    s = s.str.encode("ascii", "ignore").str.decode("ascii").str.upper()
+    s = s.str.replace(r"[^A-Z0-9]+", " ", regex=True).str.strip()
+    return s.str.replace(_MOTS, lambda m: ABREVIATIONS[m.group(1)], regex=True)
+
+
+def _decouper(adresses):
+    """Sépare une série d'adresses « voie CP, France » en cle_adresse / cle_voie / cp."""
+    parties = adresses.astype(str).str.extract(_ADRESSE)
+    voie = normaliser(parties["voie"])
+    numero = voie.str.extract(_NUMERO)
+    nom = numero["nom"].fillna(voie)
+    num = (numero["num"].fillna("") + " " + numero["rep"].fillna("")).str.strip()
+    cp = parties["cp"]
+    return pd.DataFrame({
+        "adresse": (num + " " + nom).str.strip() + "|" + cp,
+        "voie": nom + "|" + cp,
+        "commune": cp,
+    }, index=adresses.index)
+
+
+def construire_index(chemin_index, ban_csv=None, laposte_csv=None):
+    """Construit l'index Parquet à partir d'un extrait BAN (adresses-*.csv) et/ou de la table La Poste."""
+    morceaux = []
+    if ban_csv:
+        ban = pd.read_csv(
+            ban_csv, sep=";", dtype={"code_postal": str, "numero": str, "rep": str},
+            usecols=["numero", "rep", "nom_voie", "code_postal", "lon", "lat"],
+        )
+        ban = ban.dropna(subset=["code_postal", "lat", "lon"])
+        nom = normaliser(ban["nom_voie"])
+        num = (ban["numero"].fillna("") + " " + normaliser(ban["rep"])).str.strip()
+        cles = pd.DataFrame({
+            "adresse": (num + " " + nom).str.strip() + "|" + ban["code_postal"],
+            "voie": nom + "|" + ban["code_postal"],
+            "commune": ban["code_postal"],
+            "lat": ban["lat"],
+            "lon": ban["lon"],
+        })
+        for niveau in NIVEAUX:
+            # un point par adresse, le centroïde des points pour la voie et la commune
+            g = cles.groupby(niveau, sort=False)[["lat", "lon"]]
+            g = g.first() if niveau == "adresse" else g.mean()
+            morceaux.append(g.rename_axis("cle").reset_index().assign(niveau=niveau))
+
+    if laposte_csv:
+        laposte = pd.read_csv(laposte_csv, sep=";", encoding="latin1", dtype=str)
+        if "coordonnees_gps" in laposte.columns:
+            gps = laposte["coordonnees_gps"].str.split(",", expand=True).astype(float)
+            communes = pd.DataFrame({"cle": laposte["Code_postal"].str.zfill(5), "lat": gps[0], "lon": gps[1]})
+            communes = communes.dropna().groupby("cle", as_index=False)[["lat", "lon"]].mean()
+            morceaux.append(communes.assign(niveau="commune"))
+
+    index = pd.concat(morceaux, ignore_index=True)
+    # la BAN prime sur La Poste pour un même code postal
+    index = index.drop_duplicates(subset=["niveau", "cle"], keep="first")
+    index["niveau"] = index["niveau"].astype("category")
+    index[["lat", "lon"]] = index[["lat", "lon"]].astype("float32")
+    index.to_parquet(chemin_index, index=False)
+    return chemin_index
+
+
+class _Location:
+    def __init__(self, latitude, longitude):
+        self.latitude = latitude
+        self.longitude = longitude
+
+
+class GeocodeurHorsLigne:
+    """Résout les adresses par recherche en mémoire dans l'index construit par ``construire_index``."""
+
+    def __init__(self, chemin_index, niveaux=NIVEAUX):
+        index = pd.read_parquet(chemin_index)
+        self.niveaux = tuple(niveaux)
+        self.tables = {
+            niveau: index[index["niveau"] == niveau].set_index("cle")[["lat", "lon"]].astype(float)
+            for niveau in NIVEAUX
+        }
+
+    def resoudre(self, adresses, niveaux=None):
+        """Renvoie un DataFrame (latitude, longitude, niveau) aligné sur ``adresses``.
+
+        Chaque niveau n'est consulté que pour les adresses non résolues par le précédent ;
+        les lignes introuvables restent à NaN.
+        """
+        cles = _decouper(adresses)
+        res = pd.DataFrame({"latitude": float("nan"), "longitude": float("nan"), "niveau": None},
+                           index=adresses.index)
+        for niveau in niveaux or self.niveaux:
+            table = self.tables[niveau]
+            manquant = res["latitude"].isna()
+            if not manquant.any() or table.empty:
+                continue
+            cle = cles.loc[manquant, niveau]
+            lat = cle.map(table["lat"])
+            trouve = lat.notna()
+            res.loc[trouve[trouve].index, "latitude"] = lat[trouve]
+            res.loc[trouve[trouve].index, "longitude"] = cle[trouve].map(table["lon"])
+            res.loc[trouve[trouve].index, "niveau"] = niveau
+        return res
+
+    def geocode_frame(self, df, adresses, lat_col="latitude", lon_col="longitude", niveaux=None):
+        """Remplit ``df`` en place pour les lignes sans coordonnées ; renvoie le nombre de lignes résolues."""
+        if lat_col not in df.columns:
+            df[lat_col] = None
+        if lon_col not in df.columns:
+            df[lon_col] = None
+        manquant = df[lat_col].isna() | df[lon_col].isna()
+        res = self.resoudre(adresses[manquant], niveaux)
+        res = res.dropna(subset=["latitude"])
+        df.loc[res.index, lat_col] = res["latitude"]
+        df.loc[res.index, lon_col] = res["longitude"]
+        return len(res)
+
+    def geocode(self, address, timeout=None):
+        """Interface compatible geopy (une adresse à la fois)."""
+        res = self.resoudre(pd.Series([address]))
+        if pd.isna(res["latitude"].iat[0]):
+            return None
+        return _Location(res["latitude"].iat[0], res["longitude"].iat[0])
+
+
+if __name__ == "__main__":
+    # python geocodeur_hors_ligne.py adresses-86.csv [019HexaSmal.csv] -> ban_index.parquet
+    import sys
+    ban = sys.argv[1] if len(sys.argv) > 1 else None
+    laposte = sys.argv[2] if len(sys.argv) > 2 else None
+    chemin = construire_index("ban_index.parquet", ban_csv=ban, laposte_csv=laposte)
+    print(f"Index écrit : {chemin} ({os.path.getsize(chemin) / 1e6:.1f} Mo)")
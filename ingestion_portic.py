@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""Ingestion multi-dates de l'API des ports PORTIC (data.portic.fr).
+
+    python ingestion_portic.py 1749 1789 --sortie ports_portic.parquet
+    python ingestion_portic.py --dates 1787 1789 --workers 4 --cache cache_portic
+    python ingestion_portic.py 1749 1789 --stub      # serveur local à la place de data.portic.fr
+
+Les dates sont récupérées en parallèle sur une session HTTP commune (pool de
+connexions keep-alive), avec nouvelles tentatives et attente exponentielle sur
+les erreurs réseau et les réponses 429 / 5xx. Chaque réponse brute est gardée
+sur disque, sous une clé dérivée de l'URL et des paramètres : une réponse plus
+récente que ``ttl`` est relue sans appel réseau, une plus ancienne est
+revalidée par requête conditionnelle (``If-None-Match`` / ``If-Modified-Since``)
+et n'est retéléchargée que si le serveur l'a modifiée.
+
+Les ports de toutes les dates sont consolidés dans un seul fichier colonnaire
+(Parquet, Feather ou CSV selon l'extension), avec une colonne ``date``, puis
+résumés comme dans admiralty.py : nombre d'amirautés distinctes et répartition
+par ``state_1789_fr``, ici pour chaque date.
+
+``ServeurStub`` sert des réponses déterministes sur 127.0.0.1 (ETag, 304,
+erreurs 503 injectées, latence) pour essayer le client sans réseau.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+URL_PORTS = "http://data.portic.fr/api/ports/"
+# mêmes paramètres que la requête d'admiralty.py, seule la date varie
+PARAMS_DEFAUT = {"param": "", "shortenfields": "false", "both_to": "false"}
+
+
+def creer_session(workers=8, retries=5, backoff=0.5):
+    """Session partagée par les threads : pool de ``workers`` connexions, nouvelles tentatives sur 429 / 5xx."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adaptateur = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adaptateur)
+    session.mount("https://", adaptateur)
+    session.headers["Accept-Encoding"] = "gzip"
+    return session
+
+
+class CacheReponses:
+    """Réponses brutes sur disque : ``<clé>.json`` (corps) et ``<clé>.meta.json`` (ETag, Last-Modified, date)."""
+
+    def __init__(self, dossier="cache_portic"):
+        self.dossier = dossier
+        os.makedirs(dossier, exist_ok=True)
+
+    @staticmethod
+    def cle(url, params):
+        requete = url + "?" + urlencode(sorted(params.items()))
+        return hashlib.sha1(requete.encode("utf-8")).hexdigest()
+
+    def _chemin(self, cle, suffixe):
+        return os.path.join(self.dossier, cle + suffixe)
+
+    def lire(self, cle):
+        """(corps, méta) ou None si absent ou illisible."""
+        try:
+            with open(self._chemin(cle, ".meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(self._chemin(cle, ".json"), "rb") as f:
+                return f.read(), meta
+        except (OSError, ValueError):
+            return None
+
+    def _ecrire(self, chemin, octets):
+        tmp = f"{chemin}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(octets)
+        os.replace(tmp, chemin)
+
+    def ecrire(self, cle, corps, meta):
+        # corps d'abord : un méta présent garantit un corps complet
+        if corps is not None:
+            self._ecrire(self._chemin(cle, ".json"), corps)
+        self._ecrire(self._chemin(cle, ".meta.json"), json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+
+class ClientPortic:
+    """Récupère les ports PORTIC pour une liste de dates, en parallèle et via le cache disque."""
+
+    def __init__(self, url=URL_PORTS, cache="cache_portic", workers=8, retries=5, backoff=0.5,
+                 timeout=60, ttl=7 * 24 * 3600):
+        self.url = url
+        self.cache = CacheReponses(cache) if isinstance(cache, str) else cache
+        self.workers = max(1, int(workers))
+        self.timeout = timeout
+        self.ttl = ttl
+        self.session = creer_session(self.workers, retries, backoff)
+        self._lock = threading.Lock()
+        # "secours" : API en échec, ancienne réponse du cache servie ; "echec" : date non récupérée
+        self.compteurs = {"cache": 0, "revalide": 0, "telecharge": 0, "secours": 0, "echec": 0}
+        self.dates_en_echec = []
+
+    def _compter(self, provenance):
+        with self._lock:
+            self.compteurs[provenance] += 1
+
+    def recuperer(self, date, forcer=False):
+        """Liste des ports (dicts) de ``date`` ; lève une exception si l'API et le cache échouent."""
+        params = dict(PARAMS_DEFAUT, date=str(date))
+        cle = self.cache.cle(self.url, params)
+        en_cache = self.cache.lire(cle)
+        if en_cache is not None and not forcer and time.time() - en_cache[1]["recu_le"] < self.ttl:
+            self._compter("cache")
+            return json.loads(en_cache[0])
+
+        entetes = {}
+        if en_cache is not None:
+            meta = en_cache[1]
+            if meta.get("etag"):
+                entetes["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                entetes["If-Modified-Since"] = meta["last_modified"]
+        try:
+            resp = self.session.get(self.url, params=params, headers=entetes, timeout=self.timeout)
+            if resp.status_code == 304 and en_cache is not None:
+                self.cache.ecrire(cle, None, dict(en_cache[1], recu_le=time.time()))
+                self._compter("revalide")
+                return json.loads(en_cache[0])
+            resp.raise_for_status()
+            corps = resp.content
+            ports = json.loads(corps)
+        except (requests.RequestException, ValueError) as e:
+            if en_cache is not None:
+                # API indisponible : la dernière réponse connue reste utilisable
+                logging.warning('Could not refresh PORTIC ports for %s, using cached response: %s', date, e)
+                self._compter("secours")
+                return json.loads(en_cache[0])
+            raise
+        self.cache.ecrire(cle, corps, {
+            "url": self.url,
+            "params": params,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "recu_le": time.time(),
+        })
+        self._compter("telecharge")
+        return ports
+
+    def recuperer_dates(self, dates, forcer=False):
+        """Dict date -> liste de ports ; les dates en échec sont absentes du résultat,
+        comptées dans ``compteurs["echec"]`` et listées dans ``dates_en_echec``."""
+        def _une(date):
+            try:
+                return date, self.recuperer(date, forcer)
+            except Exception as e:
+                logging.warning('Could not fetch PORTIC ports for %s: %s', date, e)
+                with self._lock:
+                    self.compteurs["echec"] += 1
+                    self.dates_en_echec.append(date)
+                return date, None
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return {date: ports for date, ports in pool.map(_une, dates) if ports is not None}
+
+
+def _scalaire(v):
+    # les champs imbriqués (listes, objets) sont gardés en JSON texte pour rester colonnaires
+    return json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v
+
+
+def consolider(par_date):
+    """Un seul DataFrame (colonne ``date`` en tête), colonnes texte répétitives en category."""
+    morceaux = []
+    for date, ports in sorted(par_date.items()):
+        df = pd.DataFrame([{k: _scalaire(v) for k, v in port.items()} for port in ports])
+        df.insert(0, "date", int(date))
+        morceaux.append(df)
+    if not morceaux:
+        return pd.DataFrame(columns=["date"])
+    df = pd.concat(morceaux, ignore_index=True)
+    for col in df.columns:
+        if df[col].dtype == object and df[col].dropna().map(type).nunique() > 1:
+            df[col] = df[col].map(lambda v: None if v is None else str(v))
+        if df[col].dtype == object or pd.api.types.is_string_dtype(df[col]):
+            valeurs = df[col].dropna()
+            if len(valeurs) and valeurs.nunique() <= len(valeurs) // 2:
+                df[col] = df[col].astype("category")
+    return df
+
+
+def ecrire(df, chemin):
+    """Écrit ``df`` selon l'extension de ``chemin`` (.parquet, .feather ou .csv)."""
+    extension = os.path.splitext(chemin)[1].lower()
+    if extension == ".parquet":
+        df.to_parquet(chemin, index=False)
+    elif extension == ".feather":
+        df.to_feather(chemin)
+    elif extension == ".csv":
+        df.to_csv(chemin, index=False)
+    else:
+        raise ValueError(f"Format de sortie inconnu : {chemin}")
+
+
+def analyser(df):
+    """Par date : nombre d'amirautés distinctes et nombre de ports par ``state_1789_fr``."""
+    amirautes = df.groupby("date")["admiralty"].nunique() if "admiralty" in df else pd.Series(dtype=int)
+    if "state_1789_fr" in df:
+        counts = df.groupby(["date", "state_1789_fr"], observed=True).size().unstack(fill_value=0)
+    else:
+        counts = pd.DataFrame()
+    return amirautes.rename("amirautes"), counts
+
+
+# --- Serveur de substitution pour les essais ---
+
+class ServeurStub:
+    """Faux data.portic.fr sur 127.0.0.1 : ports déterministes par date, ETag / 304, 503 et latence injectés.
+
+    ``echecs`` : nombre de réponses 503 renvoyées pour chaque date avant la bonne réponse.
+
+        with ServeurStub(echecs=1) as stub:
+            ClientPortic(stub.url, cache=dossier).recuperer_dates(range(1780, 1790))
+    """
+
+    ETATS = ["France", "Grande-Bretagne", "Espagne", "Provinces-Unies", "Portugal", None]
+
+    def __init__(self, n_ports=200, echecs=0, latence=0.0, port=0):
+        self.n_ports = n_ports
+        self.port = port
+        self.echecs = echecs
+        self.latence = latence
+        self.requetes = 0
+        self.reponses_304 = 0
+        self._echecs_par_date = {}
+        self._lock = threading.Lock()
+        self._serveur = None
+
+    def ports(self, date):
+        n = self.n_ports + date % 17
+        return [{
+            "ogc_fid": i,
+            "uhgs_id": f"A{date % 100:02d}{i:05d}",
+            "toponym": f"Port {i}",
+            "admiralty": f"Amirauté {i % 40}" if i % 9 else None,
+            "province": f"Province {i % 25}",
+            "state_1789_fr": self.ETATS[(i + date) % len(self.ETATS)],
+            "latitude": 43.0 + (i % 50) / 10,
+            "longitude": -4.0 + (i % 70) / 10,
+        } for i in range(n)]
+
+    def _corps(self, date):
+        corps = json.dumps(self.ports(date)).encode("utf-8")
+        return corps, '"' + hashlib.sha1(corps).hexdigest() + '"'
+
+    def _gestionnaire(self):
+        stub = self
+
+        class Gestionnaire(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _envoyer(self, statut, corps=b"", entetes=None):
+                self.send_response(statut)
+                for nom, valeur in (entetes or {}).items():
+                    self.send_header(nom, valeur)
+                self.send_header("Content-Length", str(len(corps)))
+                self.end_headers()
+                self.wfile.write(corps)
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requetes += 1
+                url = urlparse(self.path)
+                if url.path.rstrip("/") != "/api/ports":
+                    return self._envoyer(404)
+                try:
+                    date = int(parse_qs(url.query).get("date", [""])[0])
+                except ValueError:
+                    return self._envoyer(400)
+                if stub.latence:
+                    time.sleep(stub.latence)
+                with stub._lock:
+                    restants = stub._echecs_par_date.setdefault(date, stub.echecs)
+                    if restants:
+                        stub._echecs_par_date[date] -= 1
+                if restants:
+                    return self._envoyer(503, entetes={"Retry-After": "0"})
+                corps, etag = stub._corps(date)
+                if self.headers.get("If-None-Match") == etag:
+                    with stub._lock:
+                        stub.reponses_304 += 1
+                    return self._envoyer(304, entetes={"ETag": etag})
+                self._envoyer(200, corps, {
+                    "Content-Type": "application/json",
+                    "ETag": etag,
+                    "Last-Modified": formatdate(usegmt=True),
+                })
+
+        return Gestionnaire
+
+    def demarrer(self):
+        self._serveur = ThreadingHTTPServer(("127.0.0.1", self.port), self._gestionnaire())
+        self._serveur.daemon_threads = True
+        threading.Thread(target=self._serveur.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._serveur.server_address[1]}/api/ports/"
+
+    def arreter(self):
+        self._serveur.shutdown()
+        self._serveur.server_close()
+
+    def __enter__(self):
+        return self.demarrer()
+
+    def __exit__(self, *exc):
+        self.arreter()
+
+
+def main():
+    """Renvoie le code de sortie : 1 si des dates n'ont pu être récupérées (ni depuis l'API, ni depuis le cache)."""
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("debut", type=int, nargs="?", help="première date (incluse)")
+    parser.add_argument("fin", type=int, nargs="?", help="dernière date (incluse)")
+    parser.add_argument("--dates", type=int, nargs="+", help="liste de dates, à la place de debut / fin")
+    parser.add_argument("--sortie", default="ports_portic.parquet")
+    parser.add_argument("--counts", default="counts_par_date.csv", help="state_1789_fr par date (cf. admiralty.py)")
+    parser.add_argument("--cache", default="cache_portic")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--ttl-heures", type=float, default=7 * 24, help="âge au-delà duquel une réponse est revalidée")
+    parser.add_argument("--forcer", action="store_true", help="revalider toutes les réponses du cache")
+    parser.add_argument("--stub", action="store_true", help="interroger un serveur local de substitution")
+    parser.add_argument("--port-stub", type=int, default=8765, help="port fixe : les clés du cache dépendent de l'URL")
+    args = parser.parse_args()
+
+    dates = args.dates or (list(range(args.debut, args.fin + 1)) if args.debut is not None else [1787])
+    stub = ServeurStub(echecs=1, latence=0.01, port=args.port_stub).demarrer() if args.stub else None
+    try:
+        client = ClientPortic(stub.url if stub else URL_PORTS, cache=args.cache, workers=args.workers,
+                              retries=args.retries, ttl=args.ttl_heures * 3600)
+        debut = time.perf_counter()
+        par_date = client.recuperer_dates(dates, forcer=args.forcer)
+        duree = time.perf_counter() - debut
+    finally:
+        if stub:
+            stub.arreter()
+
+    df = consolider(par_date)
+    ecrire(df, args.sortie)
+    amirautes, counts = analyser(df)
+    counts.to_csv(args.counts, header=True)
+    print(f"{len(par_date)}/{len(dates)} dates en {duree:.1f} s ({client.compteurs}) : "
+          f"{len(df)} ports écrits dans {args.sortie}")
+    print(amirautes.to_string())
+    if client.dates_en_echec:
+        logging.error('Dates manquantes : %s', ", ".join(map(str, sorted(client.dates_en_echec))))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
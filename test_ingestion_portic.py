@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Client PORTIC contre ServeurStub : nouvelles tentatives, revalidation 304, cache TTL, échecs comptés."""
+import pytest
+
+from ingestion_portic import ClientPortic, ServeurStub
+
+
+@pytest.fixture
+def stub():
+    with ServeurStub(n_ports=20) as serveur:
+        yield serveur
+
+
+def client(stub, dossier, **options):
+    options.setdefault("backoff", 0)
+    return ClientPortic(stub.url, cache=str(dossier), workers=2, **options)
+
+
+def test_nouvelle_tentative_sur_503(stub, tmp_path):
+    stub.echecs = 2
+    c = client(stub, tmp_path, retries=3)
+    ports = c.recuperer(1787)
+    assert ports == stub.ports(1787)
+    assert stub.requetes == 3
+    assert c.compteurs["telecharge"] == 1
+
+
+def test_revalidation_304(stub, tmp_path):
+    client(stub, tmp_path).recuperer(1787)
+    c = client(stub, tmp_path, ttl=0)
+    assert c.recuperer(1787) == stub.ports(1787)
+    assert stub.reponses_304 == 1
+    assert c.compteurs["revalide"] == 1
+
+
+def test_cache_ttl_sans_appel_reseau(stub, tmp_path):
+    client(stub, tmp_path).recuperer(1787)
+    requetes = stub.requetes
+    c = client(stub, tmp_path)
+    assert c.recuperer(1787) == stub.ports(1787)
+    assert stub.requetes == requetes
+    assert c.compteurs["cache"] == 1
+
+
+def test_dates_en_echec_comptees(stub, tmp_path):
+    stub.echecs = 10
+    c = client(stub, tmp_path, retries=1)
+    assert c.recuperer_dates([1787]) == {}
+    assert c.compteurs["echec"] == 1
+    assert c.dates_en_echec == [1787]
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Validation spatiale vectorisée et cascade de correction des points hors zone.
+
+Une ``Zone`` teste d'un seul coup tout un tableau de lat/lon : filtre par
+emprise (rectangle), puis, si des contours sont fournis (département ou
+communes), point-dans-polygone via un index spatial STRtree.
+``corriger_hors_zone`` regéocode uniquement les lignes en échec, niveau par
+niveau (adresse + commune, adresse seule, code postal + commune), chaque niveau
+étant envoyé en un seul lot au moteur de géocodage.
+"""
+import numpy as np
+import pandas as pd
+
+# Emprises (lat_min, lat_max, lon_min, lon_max) par département
+EMPRISES = {
+    "86": (46.0, 47.6, -0.5, 1.5),
+}
+
+
+class Zone:
+    """Zone de validité des points géocodés."""
+
+    def __init__(self, emprise, geometries=None):
+        self.emprise = emprise
+        self.tree = None
+        if geometries is not None:
+            from shapely import STRtree
+            self.tree = STRtree(list(geometries))
+
+    @classmethod
+    def departement(cls, code="86", contours=None, champ="code", emprise=None):
+        """Zone d'un département : emprise de ``EMPRISES`` (ou ``emprise``) et,
+        si ``contours`` est un fichier de géométries, les polygones dont ``champ`` vaut ``code``."""
+        geometries = None
+        if contours:
+            import geopandas as gpd
+            gdf = gpd.read_file(contours).to_crs(4326)
+            gdf = gdf[gdf[champ].astype(str) == str(code)]
+            if gdf.empty:
+                raise ValueError(f"Département {code} absent de {contours} (champ {champ!r})")
+            geometries = gdf.geometry.values
+            if emprise is None:
+                minx, miny, maxx, maxy = gdf.total_bounds
+                emprise = (miny, maxy, minx, maxx)
+        if emprise is None:
+            if str(code) not in EMPRISES:
+                raise ValueError(f"Pas d'emprise connue pour le département {code} : fournir ses contours "
+                                 f"ou une emprise (lat_min, lat_max, lon_min, lon_max)")
+            emprise = EMPRISES[str(code)]
+        return cls(tuple(emprise), geometries)
+
+    def contient(self, lat, lon):
+        """Tableau booléen : True pour les points (non nuls) situés dans la zone."""
+        lat = pd.to_numeric(pd.Series(lat), errors="coerce").to_numpy(dtype=float)
+        lon = pd.to_numeric(pd.Series(lon), errors="coerce").to_numpy(dtype=float)
+        lat_min, lat_max, lon_min, lon_max = self.emprise
+        with np.errstate(invalid="ignore"):
+            dedans = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        if self.tree is not None and dedans.any():
+            import shapely
+            candidats = np.flatnonzero(dedans)
+            points = shapely.points(lon[candidats], lat[candidats])
+            idx_points, _ = self.tree.query(points, predicate="within")
+            dedans[:] = False
+            dedans[candidats[np.unique(idx_points)]] = True
+        return dedans
+
+
+def variantes_adresse(df, col_adresse="Adresse  ", col_cp="Code_postal", col_commune="Nom_de_la_commune"):
+    """Les trois variantes d'adresse testées, dans l'ordre, pour chaque ligne de ``df``.
+
+    Une variante vide (aucune de ses parties renseignée) vaut NA et n'est pas envoyée au géocodeur.
+    """
+    def colonne(nom):
+        if nom not in df.columns:
+            return pd.Series("", index=df.index)
+        return df[nom].fillna("").astype(str).str.strip()
+
+    def joindre(*parties):
+        texte = parties[0].str.cat(parties[1:], sep=" ").str.replace(r"\s+", " ", regex=True).str.strip()
+        return (texte + ", France").where(texte != "")
+
+    adresse, code_postal, commune = colonne(col_adresse), colonne(col_cp), colonne(col_commune)
+    return [joindre(adresse, code_postal, commune), joindre(adresse, code_postal), joindre(code_postal, commune)]
+
+
+def corriger_hors_zone(df, moteur, zone, variantes, lat_col="latitude", lon_col="longitude"):
+    """Regéocode en lots les lignes de ``df`` hors de ``zone`` ; modifie ``df`` en place.
+
+    Les adresses déjà en cache sont résolues sans appel réseau (et donc sans
+    attente). Les lignes qu'aucune variante ne place dans la zone sont mises à
+    None. Renvoie un dict de statistiques par niveau.
+    """
+    restantes = df.index[~zone.contient(df[lat_col], df[lon_col])]
+    stats = {"hors_zone": len(restantes), "corrigees": [], "echecs": 0}
+    for variante in variantes:
+        if len(restantes) == 0:
+            break
+        # variantes vides (NA) : ligne laissée au niveau suivant
+        adresses = variante.loc[restantes].dropna()
+        resultats = moteur.geocode_many(pd.unique(adresses))
+        coords = adresses.map(resultats)
+        lat = coords.map(lambda c: c[0] if isinstance(c, tuple) else None)
+        lon = coords.map(lambda c: c[1] if isinstance(c, tuple) else None)
+        ok = zone.contient(lat, lon)
+        corrigees = adresses.index[ok]
+        df.loc[corrigees, lat_col] = lat[ok].to_numpy()
+        df.loc[corrigees, lon_col] = lon[ok].to_numpy()
+        stats["corrigees"].append(len(corrigees))
+        restantes = restantes[~restantes.isin(corrigees)]
+
+    df.loc[restantes, lat_col] = None
+    df.loc[restantes, lon_col] = None
+    stats["echecs"] = len(restantes)
+    return stats